@@ -0,0 +1,100 @@
+"""
+(C) MS Roth 2020-2023
+Active weather alerts from the National Weather Service.
+
+The store keeps the alerts from the last poll by ID. Each poll only parses the
+alerts that are new or have changed, and the alerts are expired locally from their
+cached end times, so the ticker can show every active alert, most severe first.
+
+References:
+https://www.weather.gov/documentation/services-web-api
+"""
+
+# most severe first
+SEVERITY_RANK = {'Extreme': 0, 'Severe': 1, 'Moderate': 2, 'Minor': 3}
+
+
+def parse_time(value):
+    if value is None:
+        return None
+
+    # dateutil is slow to import, so wait until there is an alert
+    import dateutil.parser
+    return dateutil.parser.isoparse(value)
+
+
+class Alert:
+    __slots__ = ('id', 'event', 'severity', 'start', 'end', 'stamp')
+
+    def __init__(self, alert_id, properties, stamp):
+        self.id = alert_id
+        self.event = properties['event']
+        self.severity = SEVERITY_RANK.get(properties.get('severity'), len(SEVERITY_RANK))
+        self.stamp = stamp
+
+        # in effect from when it is effective (or its onset) until it ends (or expires)
+        self.start = parse_time(properties.get('effective') or properties.get('onset'))
+        self.end = parse_time(properties.get('ends') or properties.get('expires'))
+
+    def is_active(self, now):
+        if self.start is None or self.start > now:
+            return False
+        return self.end is None or now < self.end
+
+
+class AlertStore:
+    def __init__(self):
+        self.alerts = {}
+        self.sorted = []
+        self.parsed = 0
+
+    def update(self, features):
+        """
+        Update the store from the features of an alerts response. Returns True if any
+        alert was added, changed, or removed.
+        """
+
+        changed = False
+        seen = set()
+        for feature in features:
+            properties = feature['properties']
+            alert_id = properties.get('id') or feature.get('id')
+            seen.add(alert_id)
+
+            # an alert only needs parsing again if it was reissued or its times changed
+            stamp = (properties.get('sent'), properties.get('effective'), properties.get('onset'),
+                     properties.get('ends'), properties.get('expires'), properties.get('event'),
+                     properties.get('severity'))
+            alert = self.alerts.get(alert_id)
+            if alert is None or alert.stamp != stamp:
+                self.alerts[alert_id] = Alert(alert_id, properties, stamp)
+                self.parsed += 1
+                changed = True
+
+        for alert_id in list(self.alerts):
+            if alert_id not in seen:
+                del self.alerts[alert_id]
+                changed = True
+
+        if changed:
+            self.sorted = sorted(self.alerts.values(),
+                                 key=lambda alert: (alert.severity, alert.start is None, alert.start or 0))
+        return changed
+
+    def active(self, now):
+        """
+        Return the alerts in effect at now (a timezone aware datetime), most severe first,
+        then by onset.
+        """
+
+        return [alert for alert in self.sorted if alert.is_active(now)]
+
+    def next_change(self, now):
+        """
+        Return when the next alert starts or ends after now, or None if none will.
+        """
+
+        times = [time for alert in self.sorted for time in (alert.start, alert.end) if time is not None and time > now]
+        return min(times, default=None)
+
+#<SDG><
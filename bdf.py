@@ -0,0 +1,111 @@
+"""
+(C) MS Roth 2020-2023
+Minimal BDF font reader.
+
+The rgbmatrix fonts are BDF files, but graphics.Font doesn't give access to its
+glyphs, so this reads them for the compositor (see compositor.py).
+
+References:
+https://adobe-type-tools.github.io/font-tech-notes/pdfs/5005.BDF_Spec.pdf
+"""
+
+# drawn for characters a font doesn't have
+REPLACEMENT_CHAR = 0xFFFD
+
+
+class Glyph:
+    """
+    A glyph's advance width, bounding box, and bitmap rows (one int per row,
+    most significant bit on the left).
+    """
+
+    __slots__ = ('width', 'bbx_width', 'bbx_height', 'x_offset', 'y_offset', 'rows')
+
+    def __init__(self, width, bbx, rows):
+        self.width = width
+        self.bbx_width, self.bbx_height, self.x_offset, self.y_offset = bbx
+        self.rows = rows
+
+
+class BdfFont:
+    def __init__(self, file):
+        self.file = file
+        self.glyphs = {}
+        self.ascent = 0
+        self.descent = 0
+        self.default_char = None
+        self.load(file)
+
+    @property
+    def height(self):
+        return self.ascent + self.descent
+
+    def load(self, file):
+        bbx = (0, 0, 0, 0)
+        encoding = None
+        width = 0
+        rows = None
+
+        with open(file, encoding='latin-1') as bdf:
+            for line in bdf:
+                fields = line.split()
+                if not fields:
+                    continue
+                keyword = fields[0]
+
+                if rows is not None:
+                    # bitmap rows are hex, padded out to whole bytes
+                    if keyword == 'ENDCHAR':
+                        if encoding is not None and encoding >= 0:
+                            pad = len(rows[0][1]) * 4 - bbx[0] if rows else 0
+                            self.glyphs[encoding] = Glyph(width, bbx, tuple(row >> pad for row, _ in rows))
+                        rows = None
+                    else:
+                        rows.append((int(keyword, 16), keyword))
+                elif keyword == 'FONTBOUNDINGBOX':
+                    bbx = tuple(int(n) for n in fields[1:5])
+                    if not self.ascent:
+                        self.ascent = bbx[1] + bbx[3]
+                        self.descent = -bbx[3]
+                elif keyword == 'FONT_ASCENT':
+                    self.ascent = int(fields[1])
+                elif keyword == 'FONT_DESCENT':
+                    self.descent = int(fields[1])
+                elif keyword == 'DEFAULT_CHAR':
+                    self.default_char = int(fields[1])
+                elif keyword == 'STARTCHAR':
+                    encoding = None
+                elif keyword == 'ENCODING':
+                    encoding = int(fields[1])
+                elif keyword == 'DWIDTH':
+                    width = int(fields[1])
+                elif keyword == 'BBX':
+                    bbx = tuple(int(n) for n in fields[1:5])
+                elif keyword == 'BITMAP':
+                    rows = []
+
+    def glyph(self, char):
+        """
+        Return the glyph for a character or, like rgbmatrix, the replacement
+        character (or the font's default character) if it has no glyph for it.
+        """
+
+        glyph = self.glyphs.get(ord(char))
+        if glyph is None:
+            glyph = self.glyphs.get(REPLACEMENT_CHAR)
+        if glyph is None and self.default_char is not None:
+            glyph = self.glyphs.get(self.default_char)
+        return glyph
+
+    def has_glyph(self, char):
+        return ord(char) in self.glyphs
+
+    def text_width(self, text):
+        width = 0
+        for char in text:
+            glyph = self.glyph(char)
+            if glyph is not None:
+                width += glyph.width
+        return width
+
+#<SDG><
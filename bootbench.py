@@ -0,0 +1,154 @@
+"""
+(C) MS Roth 2020-2023
+Measure how long the LED clock takes to start.
+
+Starts clock4 in fresh Python processes on an offscreen canvas, with canned data
+instead of network requests, and reports the median of:
+
+    startup      interpreter start up, before clock4 is imported
+    import       importing clock4
+    first frame  from the start of the process to the first frame on the canvas
+    loaded       from the start of the process until the data sources are loaded
+
+Use --max-first-frame-ms to fail (exit status 1) when start up gets slower, and
+--importtime to list the slowest imports.
+
+    python3 bootbench.py
+    python3 bootbench.py --runs 10 --max-first-frame-ms 1500
+    python3 bootbench.py --no-fast-boot
+
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+class FirstFrame(Exception):
+    pass
+
+
+def child(fast_boot):
+    """
+    Start the clock in this process and print the timings as JSON.
+    """
+
+    started = time.time()
+    t0 = time.perf_counter()
+
+    import offscreen
+    sys.modules['rgbmatrix'] = offscreen
+    import clock4
+    t_import = time.perf_counter()
+
+    import config
+    import quotes
+    import simulate
+    config.fast_boot = fast_boot
+    clock4.session = simulate.FixtureSession()
+    config.market_cache_file = None
+    clock4.market.snapshot = quotes.QuoteSnapshot(None)
+
+    options = offscreen.RGBMatrixOptions()
+    options.rows = 32
+    options.cols = 64
+    clock = clock4.Clock()
+    clock.matrix = offscreen.RGBMatrix(options=options)
+
+    # stop the clock on its first frame
+    frame = {}
+
+    def on_swap(canvas):
+        frame['time'] = time.perf_counter()
+        raise FirstFrame()
+    clock.matrix.SwapOnVSync = on_swap
+
+    try:
+        clock.run()
+    except FirstFrame:
+        pass
+
+    # now load what fast boot put off
+    clock4.load_modules()
+    t_loaded = time.perf_counter()
+
+    print(json.dumps({'started': started, 'import': t_import - t0,
+                      'first_frame': frame['time'] - t0, 'loaded': t_loaded - t0}))
+
+
+def run_child(fast_boot, importtime=False):
+    command = [sys.executable]
+    if importtime:
+        command += ['-X', 'importtime']
+    command += [os.path.join(HERE, 'bootbench.py'), '--child']
+    if not fast_boot:
+        command.append('--no-fast-boot')
+
+    spawned = time.time()
+    result = subprocess.run(command, cwd=HERE, capture_output=True, text=True)
+    for line in result.stdout.splitlines():
+        if line.startswith('{'):
+            timings = json.loads(line)
+            timings['startup'] = timings['started'] - spawned
+            return timings, result.stderr
+    raise RuntimeError('clock did not start:\n{}'.format(result.stdout + result.stderr))
+
+
+def slowest_imports(importtime_log, count=15):
+    """
+    Return the slowest (cumulative microseconds, module) lines of a -X importtime log.
+    """
+
+    imports = []
+    for line in importtime_log.splitlines():
+        if line.startswith('import time:') and '|' in line:
+            fields = line[len('import time:'):].split('|')
+            if fields[1].strip().isdigit():
+                imports.append((int(fields[1]), fields[2].rstrip()))
+    return sorted(imports, reverse=True)[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure how long the LED clock takes to start.')
+    parser.add_argument('--runs', help='Number of runs. Default: 5', default=5, type=int)
+    parser.add_argument('--no-fast-boot', dest='fast_boot', help='Load the data sources before the first frame',
+                        action='store_false')
+    parser.add_argument('--max-first-frame-ms', help='Fail if the median time to the first frame is over this', type=float)
+    parser.add_argument('--importtime', help='List the slowest imports', action='store_true')
+    parser.add_argument('--child', help=argparse.SUPPRESS, action='store_true')
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.fast_boot)
+        return
+
+    runs = [run_child(args.fast_boot)[0] for i in range(args.runs)]
+    print('{} runs, fast boot {}'.format(args.runs, 'on' if args.fast_boot else 'off'))
+    medians = {}
+    for key, label in (('startup', 'startup'), ('import', 'import'), ('first_frame', 'first frame'), ('loaded', 'loaded')):
+        values = [run[key] * 1000 for run in runs]
+        medians[key] = statistics.median(values)
+        print('  {:12} {:8.1f}ms median  ({:.1f} - {:.1f}ms)'.format(label, medians[key], min(values), max(values)))
+
+    if args.importtime:
+        print('\nslowest imports (cumulative):')
+        for microseconds, module in slowest_imports(run_child(args.fast_boot, importtime=True)[1]):
+            print('  {:8.1f}ms {}'.format(microseconds / 1000, module))
+
+    if args.max_first_frame_ms is not None:
+        first_frame = medians['first_frame'] + medians['startup']
+        if first_frame > args.max_first_frame_ms:
+            print('FAILED: first frame after {:.1f}ms, more than {}ms'.format(first_frame, args.max_first_frame_ms))
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
+
+#<SDG><
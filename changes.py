@@ -0,0 +1,69 @@
+"""
+(C) MS Roth 2020-2023
+Change detection for the data sources.
+
+Each source fingerprints the data it fetched (not the formatted string) and only
+rebuilds and publishes its ticker string when the fingerprint moves. The counts of
+updates and changes show how often each source really changes, which helps pick
+the update rates in config.py.
+"""
+
+import hashlib
+import threading
+
+
+def fingerprint(payload):
+    """
+    Return a short hash of a payload made of tuples, strings, and numbers.
+    """
+
+    return hashlib.blake2b(repr(payload).encode('utf-8'), digest_size=8).hexdigest()
+
+
+class ChangeTracker:
+    def __init__(self):
+        self.fingerprints = {}
+        self.updates = {}
+        self.changes = {}
+        self.lock = threading.Lock()
+
+    def check(self, name, payload):
+        """
+        Count an update of the named source and return its fingerprint if the payload
+        changed since the last update, or None if it didn't.
+        """
+
+        new = fingerprint(payload)
+        with self.lock:
+            self.updates[name] = self.updates.get(name, 0) + 1
+            if self.fingerprints.get(name) == new:
+                return None
+            self.fingerprints[name] = new
+            self.changes[name] = self.changes.get(name, 0) + 1
+            return new
+
+    def forget(self, name):
+        """
+        Forget the last fingerprint so the next update is published.
+        """
+
+        with self.lock:
+            self.fingerprints.pop(name, None)
+
+    def summary(self, name, update_rate):
+        """
+        Return how often the named source changed, given its update rate in minutes.
+        """
+
+        with self.lock:
+            updates = self.updates.get(name, 0)
+            changes = self.changes.get(name, 0)
+        if not updates:
+            return '{}: no updates'.format(name)
+
+        summary = '{}: changed in {} of {} updates ({:.0f}%)'.format(name, changes, updates, 100.0 * changes / updates)
+        if changes > 1:
+            summary += ', about every {:.0f} minutes'.format(updates * update_rate / changes)
+        return summary
+
+#<SDG><
@@ -11,17 +11,24 @@ import config
 import sys
 import argparse
 import os
-import yfinance as yf
 import multiprocessing as mp
-import holidays
-import requests
-import urllib3
-import dateutil.parser
-from dateutil.tz import tzlocal
+import threading
 from timeloop import Timeloop
-
-# disable HTTPS warnings
-urllib3.disable_warnings()
+import textnorm
+import quotes
+import alerts
+
+# modules for the data sources, imported by load_modules() so the clock face can be
+# showing before the slow imports finish
+holidays = None
+requests = None
+urllib3 = None
+dateutil = None
+tzlocal = None
+
+modules_lock = threading.Lock()
+modules_loaded = threading.Event()
+boot_done = threading.Event()
         
 # define time loop for weather, markets, and news updates
 tl = Timeloop()
@@ -31,6 +38,51 @@ qm = mp.Queue()
 qw = mp.Queue()
 qh = mp.Queue()
 
+# headlines can have characters the fonts don't have
+normalizer = textnorm.TextNormalizer()
+
+# active weather alerts, kept between updates (shared with clock4)
+alert_store = alerts.AlertStore()
+
+# closing quotes of the last session (shared with clock4)
+if config.market_cache_file is None:
+    quote_snapshot = quotes.QuoteSnapshot(None)
+else:
+    quote_snapshot = quotes.QuoteSnapshot(os.path.join(os.path.dirname(os.path.abspath(__file__)), config.market_cache_file))
+
+
+def load_modules():
+    """
+    Import the modules for the data sources. Safe to call from any thread; the first
+    call does the work and the others wait for it.
+    """
+
+    global holidays, requests, urllib3, dateutil, tzlocal
+    with modules_lock:
+        if modules_loaded.is_set():
+            return
+
+        import holidays
+        import requests
+        import urllib3
+        import dateutil.parser
+        from dateutil.tz import tzlocal
+
+        # disable HTTPS warnings
+        urllib3.disable_warnings()
+        modules_loaded.set()
+
+
+def boot():
+    """
+    Load the modules and get the first weather, market, and headlines data.
+    """
+
+    update_weather()
+    update_markets()
+    update_headlines()
+    boot_done.set()
+
 
 class Weather:
     """
@@ -54,7 +106,6 @@ class Weather:
         try:
             # get weather observations
             #print(self.WEATHER_URL.format(self.weather_city, self.weather_api_key))
-            onset_time = None
             weather = requests.get(self.WEATHER_URL.format(self.weather_city, self.weather_api_key), verify=False).json()
             city = weather['name']
             coord = (weather['coord']['lat'], weather['coord']['lon'])
@@ -73,33 +124,17 @@ class Weather:
             short_forecast = forecast['list'][2]['weather'][0]['description']
             self.weather_str += ' 3hr forecast: {}'.format(short_forecast)
             
-            # get weather alerts
+            # get weather alerts, and show every active one, most severe first
             # print(self.ALERT_URL.format(coord[0], coord[1]))
-            alerts = requests.get(self.ALERT_URL.format(coord[0], coord[1]), verify=False).json()
-            alert_str = ''
-            if len(alerts['features']) > 0:
-                #onset_time = alerts['features'][0]['properties']['onset']
-                ends_time = alerts['features'][0]['properties']['ends']
-                start_time = None
-                end_time = None
-                
-                if onset_time is not None:
-                    start_time = dateutil.parser.isoparse(onset_time)
-                if ends_time is not None:
-                    end_time = dateutil.parser.isoparse(ends_time)
-                    
-                # determine if statement is active
-                if start_time is not None and end_time is not None:
-                    now_time = datetime.datetime.now(tzlocal())
-                    if start_time < now_time < end_time:
-                        alert_str = '! {} !'.format(alerts['features'][0]['properties']['event'])
-                
-                # sometimes there is no end date
-                elif start_time is not None:
-                    now_time = datetime.datetime.now(tzlocal())
-                    if start_time < now_time:
-                        alert_str = '! {} !'.format(alerts['features'][0]['properties']['event'])
-                
+            alert_data = requests.get(self.ALERT_URL.format(coord[0], coord[1]), verify=False).json()
+            if 'features' in alert_data:
+                alert_store.update(alert_data['features'])
+            else:
+                # keep the alerts from the last lookup
+                print('Weather alerts error: {}'.format(alert_data.get('detail', alert_data)))
+            now_time = datetime.datetime.now(tzlocal())
+            alert_str = '  '.join('! {} !'.format(alert.event) for alert in alert_store.active(now_time))
+
             # build weather string
             if len(alert_str) > 1:
                 self.weather_str = '* Weather *  {}: {}  {}f / {}c  {}% hum  {}@{}mph  {}  3hr forecast: {}'.format(city,
@@ -149,43 +184,65 @@ class Market:
     While the market is closed, it displays the last close price.
     """
 
-    symbols = ['^DJI', '^SPX']  # DJIA, S&P500
+    symbols = []
     market_str = ''
+
+    # how long after the close to wait for the closing prices (the closing auction)
+    CLOSE_SETTLE = datetime.timedelta(minutes=15)
     
     def __init__(self):
         self.market_str = 'No Market Data'
+        self.symbols = ['^DJI', '^SPX']  # DJIA, S&P500
         self.symbols.extend(config.symbols)
         
     def get_markets(self, q):
         try:
-            tickers = yf.Tickers(self.symbols)
-            
             if self.is_business_day() and self.is_business_hours():
+                # yfinance pulls in pandas, so wait until it is needed to import it
+                import yfinance as yf
+                tickers = yf.Tickers(self.symbols)
+
                 self.market_str = '* Market update *'
                 #for i in range(len(tickers.tickers)):
                 for i in tickers.tickers:
                     trend = ''
-                    avg_bid_ask = (float(tickers.tickers[i].info['bid']) + float(tickers.tickers[i].info['ask']))/2 
-                    dif = avg_bid_ask - float(tickers.tickers[i].info['open'])
+                    # each .info is a round trip to Yahoo
+                    info = tickers.tickers[i].info
+                    avg_bid_ask = (float(info['bid']) + float(info['ask']))/2 
+                    dif = avg_bid_ask - float(info['open'])
                     if dif <= 0:
                         trend = '{:.2f}'.format(dif)
                     else:
                         trend = '+{:.2f}'.format(dif)
-                    self.market_str += '  {}: {:.2f}/{}'.format(tickers.tickers[i].info['symbol'],
-                                                      avg_bid_ask, trend)
+                    self.market_str += '  {}: {:.2f}/{}'.format(info['symbol'], avg_bid_ask, trend)
             else:
                 self.market_str = '* Markets are closed *'
-                #for i in range(len(tickers.tickers)):
-                for i in tickers.tickers:
+
+                # the closing prices can't change until the next session, so they are
+                # only fetched once after the close
+                last_session = self.last_session()
+                closes = quote_snapshot.quotes_for(last_session)
+                missing = [symbol for symbol in self.symbols if symbol not in closes]
+                if missing:
+                    import yfinance as yf
+                    tickers = yf.Tickers(missing)
+                    for symbol in missing:
+                        ticker = tickers.tickers[symbol.upper()]
+                        closes[symbol] = (float(ticker.history()['Close'][-1]), float(ticker.info['previousClose']))
+
+                    # prices from before the closing auction are shown, but fetched again next time
+                    if datetime.datetime.now() >= datetime.datetime.combine(last_session, datetime.time(16, 0)) + self.CLOSE_SETTLE:
+                        quote_snapshot.update(last_session, closes)
+
+                for symbol in self.symbols:
                     trend = ''
-                    dif = float(tickers.tickers[i].history()['Close'][-1]) - float(tickers.tickers[i].info['previousClose']) 
+                    close_price, previous_close = closes[symbol]
+                    dif = close_price - previous_close
                     if dif <= 0:
                         trend = '{:.2f}'.format(dif)
                     else:
                         trend = '+{:.2f}'.format(dif)
-                    self.market_str += '  {}: {:.2f}/{}'.format(tickers.tickers[i].info['symbol'],
-                                                      tickers.tickers[i].history()['Close'][-1],
-                                                      trend)
+                    self.market_str += '  {}: {:.2f}/{}'.format(symbol, close_price, trend)
                           
             #print('\nmarket updated @ {}'.format(datetime.datetime.now()))
             print(self.market_str)
@@ -197,10 +254,11 @@ class Market:
             q.put(self.market_str)
         return
 
-    def is_business_day(self):
-        # is today Mon - Fri and not a US holiday
-        now = datetime.datetime.now()
-        today = datetime.date(now.year, now.month, now.day)
+    def is_business_day(self, today=None):
+        # is today (or the given date) Mon - Fri and not a US holiday
+        if today is None:
+            now = datetime.datetime.now()
+            today = datetime.date(now.year, now.month, now.day)
         if today in holidays.US():
             return False
         elif today.weekday() < 5:
@@ -220,6 +278,16 @@ class Market:
             return True
         else:
             return False
+
+    def last_session(self):
+        # the business day of the last close: today after 1600, else the business day before
+        now = datetime.datetime.now()
+        day = datetime.date(now.year, now.month, now.day)
+        if now.hour < 16 or not self.is_business_day(day):
+            day -= datetime.timedelta(days=1)
+            while not self.is_business_day(day):
+                day -= datetime.timedelta(days=1)
+        return day
     
 
 class Headlines:
@@ -244,7 +312,7 @@ class Headlines:
             if int(top_headlines['totalResults']) >= 5:
                 for i in range(5):
                     headline = top_headlines['articles'][i]['title']
-                    self.headline_str += '{};  '.format(headline.encode('ascii', 'ignore'))
+                    self.headline_str += '{};  '.format(normalizer.normalize(headline))
 
             #print('\nheadlines updated @ {}'.format(datetime.datetime.now()))
             print(self.headline_str)
@@ -260,6 +328,7 @@ class Headlines:
 @tl.job(interval=datetime.timedelta(minutes=config.weather_update_rate))        
 def update_weather():
     print('\nweather updated @ {}'.format(datetime.datetime.now()))
+    load_modules()
     w = Weather()
     w.get_weather(qw)
 
@@ -267,6 +336,7 @@ def update_weather():
 @tl.job(interval=datetime.timedelta(minutes=config.market_update_rate))        
 def update_markets():
     print('\nmarkets updated @ {}'.format(datetime.datetime.now()))
+    load_modules()
     m = Market()
     m.get_markets(qm)
 
@@ -274,6 +344,7 @@ def update_markets():
 @tl.job(interval=datetime.timedelta(minutes=config.news_update_rate))        
 def update_headlines():
     print('\nheadlines updated @ {}'.format(datetime.datetime.now()))
+    load_modules()
     h = Headlines()
     h.get_headlines(qh)    
 
@@ -307,6 +378,7 @@ def run(matrix):
     last_switch = datetime.datetime.now()
     show_dow = False
     init = True
+    booting = False
     
     # start async jobs to update data
     tl.start(block=False)
@@ -377,10 +449,12 @@ def run(matrix):
         # so you can read the scrolling message
         time.sleep(.06)
 
-        if init:
-            update_weather()
-            update_markets()
-            update_headlines()
+        # load everything else in the background once the clock is showing
+        if init and not booting:
+            booting = True
+            threading.Thread(target=boot, daemon=True).start()
+
+        if init and boot_done.is_set():
             init = False
             
 
@@ -5,7 +5,7 @@ Simple LED Clock with weather forecast and stock market update.
 """
 
 import datetime
-import time
+import importlib.util
 from rgbmatrix import graphics, RGBMatrix, RGBMatrixOptions
 import config
 import sys
@@ -13,106 +13,252 @@ import argparse
 import os
 #import yfinance as yf
 import multiprocessing as mp
-import holidays
-import requests
-import urllib3
-import urllib 
-import dateutil.parser
-from dateutil.tz import tzlocal
+import threading
+import urllib.parse
 from timeloop import Timeloop
 from samplebase import SampleBase
-
-
-# disable HTTPS warnings
-urllib3.disable_warnings()
+import timesource
+import memwatch
+import quotes
+import alerts
+import sources
+import textnorm
+
+# modules for the data sources and the compositor, imported by load_modules() so
+# the clock face can be showing before the slow imports finish
+holidays = None
+requests = None
+urllib3 = None
+dateutil = None
+tzlocal = None
+compositor = None
+
+# shared HTTP session so connections are reused between updates
+session = None
+
+modules_lock = threading.Lock()
+modules_loaded = threading.Event()
+boot_done = threading.Event()
         
 # define time loop for weather, markets, and news updates
 tl = Timeloop()
 
-# global queues to pass strings among processes
-qm = mp.Queue()
-qw = mp.Queue()
-qh = mp.Queue()
+
+def snapshot_file():
+    # relative to the clock, not to where it was started
+    if config.market_cache_file is None:
+        return None
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), config.market_cache_file)
+
+# global queue to pass (source name, fingerprint, texts) among processes
+qs = mp.Queue()
+
+# names of the config settings changed by a reload, for the renderer
+qc = mp.Queue()
+
+# to notice when config.py is saved, and the last error in it (printed once)
+config_mtime = os.path.getmtime(config.__file__)
+config_error = None
+
+
+def load_modules():
+    """
+    Import the modules for the data sources and the compositor. Safe to call from any
+    thread; the first call does the work and the others wait for it.
+    """
+
+    global holidays, requests, urllib3, dateutil, tzlocal, compositor, session
+    with modules_lock:
+        if modules_loaded.is_set():
+            return
+
+        import holidays
+        import requests
+        import urllib3
+        import dateutil.parser
+        from dateutil.tz import tzlocal
+        import compositor
+
+        # disable HTTPS warnings
+        urllib3.disable_warnings()
+
+        if session is None:
+            session = requests.Session()
+        runner.session = session
+        modules_loaded.set()
+
+
+def boot():
+    """
+    Load the modules and get the first weather, market, and headlines data.
+    """
+
+    load_modules()
+    for name in runner.sources:
+        runner.update(name)
+    boot_done.set()
 
 
-class Weather:
+class Weather(sources.Source):
     """
+    Weather for each of the locations (zip codes) in config.weather_locations.
+
+    Current conditions come from as few group calls as possible, once the city ID
+    of each zip code is known. The forecasts, the first lookups by zip code, and the
+    alerts are fetched on the shared pool, with one alerts lookup for locations that
+    round to the same point. The ticker rotates through the locations.
+
     References:
     https://openweathermap.org/current
     """
 
     WEATHER_URL = 'http://api.openweathermap.org/data/2.5/weather?zip={},us&units=imperial&appid={}'
+    GROUP_URL = 'http://api.openweathermap.org/data/2.5/group?id={}&units=imperial&appid={}'
     FORECAST_URL = 'http://api.openweathermap.org/data/2.5/forecast?zip={},us&units=imperial&cnt=3&appid={}'
     ALERT_URL = 'http://api.weather.gov/alerts?active=true&point={},{}'
-    weather_str = ''
-    weather_api_key = ''
-    weather_city = ''
+    GROUP_SIZE = 20
+    name = 'weather'
+    rate = 'weather_update_rate'
+    settings = ('weather_locations', 'weather_api_key', 'alert_point_precision')
+    placeholder = 'No weather data yet.'
         
     def __init__(self):
-        self.weather_str = 'No Weather Data'
-        self.weather_api_key = config.weather_api_key
-        self.weather_city = config.weather_city       
         self.degrees = u"\N{Degree Sign}"
-        self.headers = {'User-Agent': 'LED-Clock'}
 
-    def get_weather(self, q):
-        try:
-            # get weather observations
-            onset_time = None
-            weather = requests.get(self.WEATHER_URL.format(self.weather_city, self.weather_api_key), headers=self.headers, verify=False).json()
-            city = weather['name']
-            coord = (weather['coord']['lat'], weather['coord']['lon'])
-            temp_f = int(weather['main']['temp'])
+        # OpenWeatherMap city IDs by zip code, and active weather alerts by (rounded)
+        # point, kept between updates
+        self.city_ids = {}
+        self.alert_stores = {}
+
+        # when the next alert starts or ends, to update the texts without a fetch
+        self.expires = None
+
+    def get_observations(self, fetcher, locations):
+        """
+        Return the current conditions for each location, by zip code.
+        """
+
+        observations = {}
+
+        # locations with known city IDs, in groups
+        known = [zip_code for zip_code in locations if zip_code in self.city_ids]
+        for i in range(0, len(known), self.GROUP_SIZE):
+            group = known[i:i + self.GROUP_SIZE]
+
+            # zip codes can share a city ID, so ask for each ID once and give it to all of them
+            ids = {}
+            for zip_code in group:
+                ids.setdefault(self.city_ids[zip_code], []).append(zip_code)
+            weather = fetcher.get(self.GROUP_URL.format(','.join(str(city_id) for city_id in ids), config.weather_api_key))
+            for city in weather['list']:
+                for zip_code in ids.get(city['id'], ()):
+                    observations[zip_code] = city
+
+        # the rest one by one, which also gives their city IDs for next time
+        unknown = [zip_code for zip_code in locations if zip_code not in self.city_ids]
+        urls = [self.WEATHER_URL.format(zip_code, config.weather_api_key) for zip_code in unknown]
+        for zip_code, weather in zip(unknown, fetcher.get_all(urls)):
+            if 'coord' not in weather:
+                # e.g., {'cod': '404', 'message': 'city not found'}, so leave this one out
+                print('Weather error for {}: {}'.format(zip_code, weather.get('message', weather)))
+                continue
+            if 'id' in weather:
+                self.city_ids[zip_code] = weather['id']
+            observations[zip_code] = weather
+        return observations
+
+    def fetch(self, fetcher):
+        locations = list(config.weather_locations)
+
+        # get weather observations
+        observations = self.get_observations(fetcher, locations)
+
+        # get forcasts
+        urls = [self.FORECAST_URL.format(zip_code, config.weather_api_key) for zip_code in locations]
+        forecasts = dict(zip(locations, fetcher.get_all(urls)))
+
+        # get weather alerts, with one lookup for nearby locations (ones that round to the same point)
+        points = {}
+        for zip_code, weather in observations.items():
+            point = (round(weather['coord']['lat'], config.alert_point_precision),
+                     round(weather['coord']['lon'], config.alert_point_precision))
+            points.setdefault(point, []).append(zip_code)
+
+        # looked up at the exact coordinates of the first one, so the alerts are for the zones
+        # a real location is in (the NWS takes up to 4 decimal places)
+        urls = []
+        for zip_codes in points.values():
+            coord = observations[zip_codes[0]]['coord']
+            urls.append(self.ALERT_URL.format(round(coord['lat'], 4), round(coord['lon'], 4)))
+        alert_data = dict(zip(list(points), fetcher.get_all(urls)))
+
+        return locations, observations, forecasts, points, alert_data
+
+    def parse(self, raw):
+        locations, observations, forecasts, points, alert_data = raw
+
+        # only the new or changed alerts need parsing
+        now = timesource.now(tzlocal())
+        events = {}
+        for point, zip_codes in points.items():
+            store = self.alert_stores.setdefault(point, alerts.AlertStore())
+            if 'features' in alert_data[point]:
+                store.update(alert_data[point]['features'])
+            else:
+                # keep the alerts from the last lookup
+                print('Weather alerts error for {}: {}'.format(point, alert_data[point].get('detail', alert_data[point])))
+            for zip_code in zip_codes:
+                events[zip_code] = tuple(alert.event for alert in store.active(now))
+
+        # forget the alerts for points no longer shown
+        for point in list(self.alert_stores):
+            if point not in points:
+                del self.alert_stores[point]
+
+        # alerts are checked again when the next one starts or ends, not only on the next poll
+        changes = [store.next_change(now) for store in self.alert_stores.values()]
+        self.expires = min((change for change in changes if change is not None), default=None)
+
+        payloads = []
+        for zip_code in locations:
+            # lookups that failed were already reported
+            if zip_code not in observations:
+                continue
+            try:
+                weather = observations[zip_code]
+                city = weather['name']
+                temp_f = int(weather['main']['temp'])
+                feels_like = int(weather['main']['feels_like']/1.0)
+                humidity = weather['main']['humidity']
+                wind_dir = self.get_wind_direction(weather['wind']['deg'])
+                wind_speed = int(weather['wind']['speed'])
+                description = weather['weather'][0]['description']
+                short_forecast = forecasts[zip_code]['list'][2]['weather'][0]['description']
+            except (KeyError, IndexError, TypeError, ValueError) as ex:
+                # show the other locations
+                print('Weather error for {}: {}'.format(zip_code, ex))
+                continue
+            payloads.append((city, temp_f, feels_like, humidity, wind_dir, wind_speed, description, short_forecast,
+                             events[zip_code]))
+
+        # keep showing the last weather if no location worked
+        if locations and not payloads:
+            raise ValueError('no weather for any location')
+        return tuple(payloads)
+
+    def format(self, payload):
+        weather_strs = []
+        for city, temp_f, feels_like, humidity, wind_dir, wind_speed, description, short_forecast, alert_events in payload:
             temp_c = int((temp_f - 32) / 1.8)
-            feels_like = int(weather['main']['feels_like']/1.0)
-            humidity = weather['main']['humidity']
-            wind_dir = self.get_wind_direction(weather['wind']['deg'])
-            wind_speed = int(weather['wind']['speed'])
-            description = weather['weather'][0]['description']
-
-            # get forcast
-            forecast = requests.get(self.FORECAST_URL.format(self.weather_city, self.weather_api_key), headers=self.headers, verify=False).json()
-            short_forecast = forecast['list'][2]['weather'][0]['description']
-                      
-            # get weather alerts
-            alerts = requests.get(self.ALERT_URL.format(coord[0], coord[1]), headers=self.headers, verify=False).json()
             alert_str = ''
-            if len(alerts['features']) > 0:
-                onset_time = alerts['features'][len(alerts['features'])-1]['properties']['effective']  # take latest alert
-                ends_time = alerts['features'][len(alerts['features'])-1]['properties']['ends']        # take latest alert 
-                start_time = None
-                end_time = None
-                
-                if onset_time is not None:
-                    start_time = dateutil.parser.isoparse(onset_time)
-                if ends_time is not None:
-                    end_time = dateutil.parser.isoparse(ends_time)
-                    
-                # determine if statement is active
-                if start_time is not None and end_time is not None:
-                    now_time = datetime.datetime.now(tzlocal())
-                    if start_time <= now_time < end_time:
-                        alert_str = '! {} ! '.format(alerts['features'][len(alerts['features'])-1]['properties']['event'])  # take latest alert
-                
-                # sometimes there is no end date
-                elif start_time is not None:
-                    now_time = datetime.datetime.now(tzlocal())
-                    if start_time <= now_time:
-                        alert_str = '! {} ! '.format(alerts['features'][0]['properties']['event'])
-                
+            for event in alert_events:
+                alert_str += '! {} ! '.format(event)
+
             # build weather string with or without alert
-            self.weather_str = '* Weather *  {} : {}{}{}f / {}{}c (feels like {}{}f). {}% rel hum.  winds {}@{}mph. {}. 3hr forecast: {}.'.format(city,
+            weather_str = '* Weather *  {} : {}{}{}f / {}{}c (feels like {}{}f). {}% rel hum.  winds {}@{}mph. {}. 3hr forecast: {}.'.format(city,
                                     alert_str, temp_f, self.degrees, temp_c, self.degrees, feels_like, self.degrees, humidity, wind_dir, wind_speed, description, short_forecast)
-
-            #print('\nweather updated @ {}'.format(datetime.datetime.now()))
-            print(self.weather_str)
-            
-            # put the weather string in the queue so it can be retrieved asynchronously.
-            q.put(self.weather_str)
-        except Exception as ex:
-            print('Weather error: {}'.format(ex))
-            q.put(self.weather_str)
-        return
+            weather_strs.append(weather_str)
+        return weather_strs
         
     def get_wind_direction(self, deg):
         """
@@ -137,60 +283,138 @@ class Weather:
             return 'NW'
         
         
-class Market:
+class Market(sources.Source):
     """
     Return stock market data from Yahoo Financial for the indexes in addition to other 
     symbols read from the config.py file.
 
     The ticker displays the current or last price and the delta from its opening price.
 
+    While the market is open, each price is added to the quote history so the ticker
+    can draw a sparkline in the gap after the symbol. While it is closed, the quotes
+    come from the snapshot of the last session, and are only fetched when the
+    snapshot is from an earlier session or is missing a symbol. A quote only goes in
+    the snapshot once it is from the close, so one from before the closing auction
+    isn't shown until the next open.
+
     """
 
-    symbols = []
-    market_str = ''
     MARKET_URL = 'http://query2.finance.yahoo.com/v8/finance/chart/{}'
-    
+
+    # how long after the close to wait for the closing prices, for quotes without a time
+    CLOSE_SETTLE = datetime.timedelta(minutes=15)
+    name = 'markets'
+    rate = 'market_update_rate'
+    settings = ('sparklines', 'spark_width', 'market_history_size', 'market_cache_file')
+    placeholder = 'No market data yet.'
+
     def __init__(self):
-        self.market_str = 'No Market Data'
-        self.symbols = ['^DJI', '^SPX']  # DJIA, S&P500
-        self.symbols.extend(config.symbols)
-        self.headers = {'User-Agent': 'LED-Clock'}
-            
-    def get_markets(self, q):
-        try:
+        # latest (price, previous close) for each symbol and intraday prices for the
+        # ticker sparklines, kept between updates (and only changed by fetch)
+        self.latest_quotes = {}
+        self.quote_history = quotes.QuoteHistory(config.market_history_size)
+
+        # closing quotes of the last session, so they are only fetched once after the close
+        self.snapshot = quotes.QuoteSnapshot(snapshot_file())
+
+    def symbols(self):
+        return ['^DJI', '^SPX'] + list(config.symbols)  # DJIA, S&P500
+
+    def reconfigure(self, changed):
+        # fetch only the new symbols (the update drops the removed ones)
+        if 'symbols' in changed:
+            return {'new_only': True}
+        elif changed & set(self.settings):
+            return {'symbols': []}
+        return None
             
-            if self.is_business_day() and self.is_business_hours():
-                self.market_str = '* Market update *'
-            else:
-                self.market_str = '* Markets are closed *'
-                            
-            for symbol in self.symbols:   
-                trend = ''
-                url = self.MARKET_URL.format(urllib.parse.quote_plus(symbol))
-                chart = requests.get(url, headers=self.headers, verify=False).json()
-                
-                close_price = float(chart['chart']['result'][0]['meta']['chartPreviousClose'])
-                current_price = float(chart['chart']['result'][0]['meta']['regularMarketPrice'])
-                dif = current_price - close_price
+    def fetch(self, fetcher, symbols=None, new_only=False):
+        """
+        Fetch all the symbols, only the ones given, or only the ones not fetched yet (e.g.,
+        symbols just added to the config), and return whether the market is open and the
+        latest (symbol, price, previous close) of each symbol.
+        """
 
-                if dif <= 0:
-                    trend = '{:.2f}'.format(dif)
-                else:
-                    trend = '+{:.2f}'.format(dif)
-                self.market_str += '  {}: {:.2f}/{}'.format(symbol, current_price, trend)
-            print(self.market_str)
-            
-            # put the market string into the queue to be read later
-            q.put(self.market_str)
-        except Exception as ex:
-            print('Markets error: {}'.format(ex))
-            q.put(self.market_str)
-        return
+        # the quotes are only changed here, and the runner updates a source one
+        # update at a time, so a config reload can't change them mid-update
+        configured = self.symbols()
+        for symbol in [symbol for symbol in self.latest_quotes if symbol not in configured]:
+            del self.latest_quotes[symbol]
+            self.quote_history.remove(symbol)
+        if self.quote_history.size != config.market_history_size:
+            self.quote_history.resize(config.market_history_size)
+        if self.snapshot.file != snapshot_file():
+            self.snapshot = quotes.QuoteSnapshot(snapshot_file())
+
+        is_open = self.is_business_day() and self.is_business_hours()
+
+        if new_only:
+            symbols = [symbol for symbol in configured if symbol not in self.latest_quotes]
+        fetch = configured if symbols is None else symbols
+        if not is_open:
+            # the closing prices can't change until the next session
+            last_session = self.last_session()
+            closes = self.snapshot.quotes_for(last_session)
+            self.latest_quotes.update((symbol, closes[symbol]) for symbol in fetch if symbol in closes)
+            fetch = [symbol for symbol in fetch if symbol not in closes]
+
+        urls = [self.MARKET_URL.format(urllib.parse.quote_plus(symbol)) for symbol in fetch]
+        closed = []
+        for symbol, chart in zip(fetch, fetcher.get_all(urls)):
+            try:
+                meta = chart['chart']['result'][0]['meta']
+                close_price = float(meta['chartPreviousClose'])
+                current_price = float(meta['regularMarketPrice'])
+            except (KeyError, IndexError, TypeError, ValueError):
+                # keep the last quote, if there is one
+                print('Markets error for {}: {}'.format(symbol, chart.get('error', chart) if isinstance(chart, dict) else chart))
+                continue
+            self.latest_quotes[symbol] = (round(current_price, 2), round(close_price, 2))
+
+            if is_open:
+                self.quote_history.append(symbol, current_price, timesource.now().date())
+            elif self.is_closing_quote(meta, last_session):
+                closed.append(symbol)
+
+        # quotes from before the closing auction are shown, but fetched again next time
+        if closed:
+            closes.update((symbol, self.latest_quotes[symbol]) for symbol in closed)
+            self.snapshot.update(last_session, closes)
+        return is_open, tuple((symbol,) + self.latest_quotes[symbol] for symbol in configured if symbol in self.latest_quotes)
+
+    def parse(self, raw):
+        is_open, prices = raw
+        return is_open, config.sparklines, config.spark_width, prices
+
+    def format(self, payload):
+        is_open, sparklines, spark_width, prices = payload
+        if is_open:
+            market_str = '* Market update *'
+        else:
+            market_str = '* Markets are closed *'
+
+        # leave room for the sparklines
+        if sparklines:
+            gap = ' ' * (spark_chars() + 2)
+        else:
+            gap = ' '
+
+        for symbol, current_price, close_price in prices:
+            trend = ''
+            dif = current_price - close_price
 
-    def is_business_day(self):
-        # is today Mon - Fri and not a US holiday
-        now = datetime.datetime.now()
-        today = datetime.date(now.year, now.month, now.day)
+            if dif <= 0:
+                trend = '{:.2f}'.format(dif)
+            else:
+                trend = '+{:.2f}'.format(dif)
+            market_str += '  {}:{}{:.2f}/{}'.format(symbol, gap, current_price, trend)
+        return (market_str,)
+
+    def is_business_day(self, today=None):
+        # is today (or the given date) Mon - Fri and not a US holiday
+        if today is None:
+            now = timesource.now()
+            today = datetime.date(now.year, now.month, now.day)
         if today in holidays.US():
             return False
         elif today.weekday() < 5:
@@ -200,7 +424,7 @@ class Market:
 
     def is_business_hours(self):
         # US markets open at 0930 and close at 1600
-        now = datetime.datetime.now()
+        now = timesource.now()
         if now.hour == 9:
             if now.minute >= 30:
                 return True
@@ -210,46 +434,158 @@ class Market:
             return True
         else:
             return False
+
+    def is_closing_quote(self, meta, session):
+        # is the quote from the session's close: quoted at 1600 or later, or without a
+        # quote time, fetched once the close has settled
+        close = datetime.datetime.combine(session, datetime.time(16, 0))
+        if meta.get('regularMarketTime') is None:
+            return timesource.now() >= close + self.CLOSE_SETTLE
+        return datetime.datetime.fromtimestamp(meta['regularMarketTime']) >= close
+
+    def last_session(self):
+        # the business day of the last close: today after 1600, else the business day before
+        now = timesource.now()
+        day = datetime.date(now.year, now.month, now.day)
+        if now.hour < 16 or not self.is_business_day(day):
+            day -= datetime.timedelta(days=1)
+            while not self.is_business_day(day):
+                day -= datetime.timedelta(days=1)
+        return day
     
 
-class Headlines:
+class Headlines(sources.Source):
     """
     Get top headlines (5) from source defined in config file
     """
 
-    NEWS_URL = 'http://newsapi.org/v2/top-headlines?sources={}&apiKey={}'.format(config.news_source, config.news_api_key)
-        
-    def __init__(self):
-        self.headline_str = 'No Headlines Data'
-        self.headers = {'User-Agent': 'LED-Clock'}
+    NEWS_URL = 'http://newsapi.org/v2/top-headlines?sources={}&apiKey={}'
+    name = 'headlines'
+    rate = 'news_update_rate'
+    settings = ('news_source', 'news_api_key')
+    placeholder = 'No headlines data yet.'
         
-    def get_headlines(self, q):
-        
-        try:
-            response = requests.get(self.NEWS_URL, headers=self.headers, verify=False)
-            top_headlines = response.json()
+    def fetch(self, fetcher):
+        return fetcher.get(self.NEWS_URL.format(config.news_source, config.news_api_key))
 
-            self.headline_str = '* Headlines *  '
-            headline = ''
-            if int(top_headlines['totalResults']) >= 5:
-                for i in range(5):
-                    headline = top_headlines['articles'][i]['title']
-                    self.headline_str += '{}.  '.format(headline)
+    def parse(self, top_headlines):
+        if int(top_headlines['totalResults']) >= 5:
+            return tuple(top_headlines['articles'][i]['title'] for i in range(5))
+        return ()
 
-            print(self.headline_str)
-            
-            # put the headlines string into the queue to be read later
-            q.put(self.headline_str.rstrip())
-        except Exception as ex:
-            print('Headlines error: {}'.format(ex))
-            q.put(self.headline_str)
-        return
+    def format(self, headlines):
+        headline_str = '* Headlines *  '
+        for headline in headlines:
+            headline_str += '{}.  '.format(headline)
+        return (headline_str.rstrip(),)
+
+
+# updates every source on a shared pool, and puts its texts in the queue when they change
+runner = sources.SourceRunner(qs, tl, config.source_max_workers, setup=load_modules)
+
+# the ticker shows the sources in this order (the renderer draws the market's sparklines)
+market = Market()
+for source in (Weather(), market, Headlines()):
+    runner.add(source)
+
+
+def spark_chars():
+    """
+    Return the number of ticker characters a sparkline covers.
+    """
+
+    return (config.spark_width + 4) // 5
 
 
 class Clock(SampleBase):
     def __init__(self, *args, **kwargs):
         super(Clock, self).__init__(*args, **kwargs)
 
+    def is_idle(self, now):
+        """
+        Return True during quiet hours or when the ticker is disabled.
+        """
+
+        if not config.ticker_enabled:
+            return True
+
+        # quiet hours can wrap past midnight (e.g., 23 - 6)
+        start = config.quiet_hours_start
+        end = config.quiet_hours_end
+        if start == end:
+            return False
+        elif start < end:
+            return start <= now.hour < end
+        else:
+            return now.hour >= start or now.hour < end
+
+    def ramp_brightness(self, target):
+        """
+        Step the matrix brightness toward the target so the display dims and brightens gradually.
+        """
+
+        brightness = self.matrix.brightness
+        if brightness < target:
+            self.matrix.brightness = min(brightness + config.brightness_ramp_step, target)
+        elif brightness > target:
+            self.matrix.brightness = max(brightness - config.brightness_ramp_step, target)
+
+    def find_sparklines(self, market_string, market_x):
+        """
+        Return (x offset, symbol) for the sparkline gap after each symbol in the market string,
+        where market_x is the position of the market string in the ticker.
+        """
+
+        offsets = []
+        for symbol in list(market.quote_history.rings):
+            i = market_string.find('  {}:'.format(symbol))
+            if i >= 0:
+                offsets.append(((market_x + i + len(symbol) + 4) * 5, symbol))
+        return offsets
+
+    def draw_sparklines(self, canvas, x, offsets, comp=None):
+        """
+        Draw the sparklines on the ticker line when they are on screen, into the
+        compositor's frame if there is one.
+        """
+
+        for offset, symbol in offsets:
+            spark_x = x + offset
+            if spark_x <= -config.spark_width or spark_x >= 64:
+                continue
+
+            points, up = market.quote_history.sparkline(symbol, config.spark_width, 7)
+            color = self.upColor if up else self.downColor
+            if comp is not None:
+                comp.draw_points(points, spark_x, 24, (color.red, color.green, color.blue))
+                continue
+            for dx, dy in points:
+                canvas.SetPixel(spark_x + dx, 24 + dy, color.red, color.green, color.blue)
+
+    def setup_compositor(self, color):
+        """
+        Return a Compositor to build the frames, or None to draw them with graphics.DrawText.
+        """
+
+        if not config.compositor:
+            return None
+        if compositor is None or not compositor.available:
+            print('Compositor needs numpy and Pillow, drawing text instead')
+            return None
+
+        try:
+            comp = compositor.Compositor(self.matrix.width, self.matrix.height,
+                                         os.path.join(config.font_dir, '5x7.bdf'),
+                                         os.path.join(config.font_dir, '7x13.bdf'),
+                                         (color.red, color.green, color.blue))
+            if config.time_gradient is not None:
+                comp.set_time_gradient(*config.time_gradient)
+            comp.set_alert_color(config.alert_color)
+        except Exception as ex:
+            print('Compositor error: {}'.format(ex))
+            return None
+        return comp
+
     def run(self):
         """
         Run the clock.
@@ -263,54 +599,133 @@ class Clock(SampleBase):
         
         # setup the fonts for the clock
         font = graphics.Font()
-        font.LoadFont("/home/pi/mlb-led-scoreboard/submodules/matrix/fonts/5x7.bdf")
+        font.LoadFont(os.path.join(config.font_dir, '5x7.bdf'))
         time_font = graphics.Font()
-        time_font.LoadFont("/home/pi/mlb-led-scoreboard/submodules/matrix/fonts/7x13.bdf")
+        time_font.LoadFont(os.path.join(config.font_dir, '7x13.bdf'))
+
+        # swaps characters the ticker font doesn't have for ones it does
+        normalizer = textnorm.TextNormalizer([os.path.join(config.font_dir, '5x7.bdf')])
         
         # text will be yellow
         textColor = graphics.Color(255, 235, 59)
 
+        # sparklines are green when the symbol is up on the day, red when down
+        self.upColor = graphics.Color(76, 175, 80)
+        self.downColor = graphics.Color(244, 67, 54)
+
+        # frames are drawn with DrawText until the compositor has loaded
+        comp = None
+        booting = False
+        if not config.fast_boot:
+            load_modules()
+
         # set initial values
-        weather_string = 'No weather data yet.'
-        market_string = 'No market data yet.'
-        headlines_string = 'No headlines data yet.'
+        # the texts from each source, in ticker order, and which of them is showing
+        texts = dict(runner.texts)
+        showing = dict.fromkeys(texts, 0)
+        rotate = False
+        msg_string = ''
+        spark_offsets = []
+
+        # fingerprints of the data on the ticker, so it is only rebuilt when they move
+        shown = {}
         
         big_x = 64
-        last_switch = datetime.datetime.now().astimezone()
+        full_brightness = self.matrix.brightness
+        last_switch = timesource.now().astimezone()
         show_dow = False
         init = True
         
+        # memory tracking can be toggled with SIGUSR1 while running
+        if config.memory_tracking:
+            memwatch.enable()
+        memwatch.install_signal()
+
         # start async jobs to update data
-        tl.start(block=False)
+        timesource.start_jobs(tl)
 
         try:
-            while True:
+            while timesource.running():
                 
                 # get the current time
-                now = datetime.datetime.now().astimezone()
+                now = timesource.now().astimezone()
+
+                # dim and slow down to clock-only updates while idle
+                idle = self.is_idle(now)
+                if idle:
+                    self.ramp_brightness(config.idle_brightness)
+                else:
+                    self.ramp_brightness(full_brightness)
 
                 # references for time formats
                 # https://www.programiz.com/python-programming/datetime/strftime
                 
-                # if new weather data, use it
-                if not qw.empty():
-                    weather_string = qw.get()
-                    
-                # if new market data, use it
-                if not qm.empty():
-                    market_string = qm.get()
-                    
-                # if new market data, use it
-                if not qh.empty():
-                    headlines_string = qh.get()
+                # show the next text of each source (e.g., weather location) once the
+                # ticker has scrolled by
+                updated = not msg_string
+                if rotate:
+                    rotate = False
+                    for name in texts:
+                        if len(texts[name]) > 1:
+                            showing[name] = (showing[name] + 1) % len(texts[name])
+                            updated = True
+
+                # use any new data from the sources
+                while not qs.empty():
+                    name, fingerprint, new_texts = qs.get()
+                    if fingerprint != shown.get(name):
+                        shown[name] = fingerprint
+                        texts[name] = new_texts
+                        showing[name] %= len(new_texts)
+                        updated = True
+
+                # redraw only what a config reload changed
+                if not qc.empty():
+                    changed = qc.get()
+                    if 'font_dir' in changed:
+                        # keep the fonts already loaded if the new ones can't be
+                        try:
+                            new_font = graphics.Font()
+                            new_font.LoadFont(os.path.join(config.font_dir, '5x7.bdf'))
+                            new_time_font = graphics.Font()
+                            new_time_font.LoadFont(os.path.join(config.font_dir, '7x13.bdf'))
+                            font, time_font = new_font, new_time_font
+                            normalizer = textnorm.TextNormalizer([os.path.join(config.font_dir, '5x7.bdf')])
+                            updated = True
+                        except Exception as ex:
+                            print('Font error: {}'.format(ex))
+                    if not init and changed & {'compositor', 'font_dir', 'time_gradient', 'alert_color'}:
+                        comp = self.setup_compositor(textColor)
+                        updated = True
+                    if 'sparklines' in changed:
+                        updated = True
+
+                # concat the msg strings and find the sparklines only when something changed,
+                # once the data is loaded
+                if updated and not init:
+                    parts = [normalizer.normalize(texts[name][showing[name]]) for name in texts]
+                    msg_string = (' '*8).join(parts)
+
+                    # the sparklines go in the market text
+                    spark_offsets = []
+                    if config.sparklines:
+                        x = 0
+                        for name, part in zip(texts, parts):
+                            if name == 'markets':
+                                spark_offsets = self.find_sparklines(part, x)
+                            x += len(part) + 8
+                    if comp is not None:
+                        comp.set_ticker(msg_string)
                     
                 # switch dow and date every X sec
                 if (now - last_switch).seconds > config.face_flip_rate:
-                    last_switch = datetime.datetime.now().astimezone()
+                    last_switch = timesource.now().astimezone()
                     if show_dow == False:
                         show_dow = True
                     else:
                         show_dow = False
+                    if comp is not None:
+                        comp.flip_face(0 if idle else config.face_fade_frames)
                         
                 # display clock    
                 if show_dow == False:
@@ -321,66 +736,207 @@ class Clock(SampleBase):
                     date_string = now.strftime('%b %d, %Y')
                     time_string = now.strftime('%H:%M:%S')
                     
-                # concat the msg strings
-                msg_string = weather_string + ' '*8 + market_string + ' '*8 + headlines_string
-                
-                # fill convas with black
-                canvas.Fill(0, 0, 0)
-                
                 # calculate element positions
                 time_pos = int((64 - len(time_string) * 7) / 2)
                 date_pos = int((64 - len(date_string) * 5) / 2)
-                
-                # put elements on canvas
-                graphics.DrawText(canvas, time_font, time_pos, 11, textColor, time_string)
-                graphics.DrawText(canvas, font, date_pos, 20, textColor, date_string)
-                if init:
-                    graphics.DrawText(canvas, font, 2, 30, textColor, 'Loading data')
-                else:
-                    graphics.DrawText(canvas, font, big_x, 30, textColor, msg_string)
 
-                # calculate scroll horizontal position
-                big_x = big_x - 1
-                if big_x < len(msg_string) * -5:
-                    big_x = 64
+                if comp is not None:
+                    # build the frame and copy it to the canvas in one go
+                    comp.draw_face(time_string, time_pos, date_string, date_pos)
+                    if init:
+                        comp.draw_message(2, 30, 'Loading data')
+                    elif not idle:
+                        comp.draw_ticker(big_x, 30)
+                        self.draw_sparklines(canvas, big_x, spark_offsets, comp)
+
+                        # calculate scroll horizontal position
+                        big_x = big_x - 1
+                        if big_x < -comp.ticker_width():
+                            big_x = 64
+                            rotate = True
+                    comp.show(canvas)
+                else:
+                    # fill convas with black
+                    canvas.Fill(0, 0, 0)
+
+                    # put elements on canvas
+                    graphics.DrawText(canvas, time_font, time_pos, 11, textColor, time_string)
+                    graphics.DrawText(canvas, font, date_pos, 20, textColor, date_string)
+                    if init:
+                        graphics.DrawText(canvas, font, 2, 30, textColor, 'Loading data')
+                    elif not idle:
+                        graphics.DrawText(canvas, font, big_x, 30, textColor, msg_string)
+                        self.draw_sparklines(canvas, big_x, spark_offsets)
+
+                        # calculate scroll horizontal position
+                        big_x = big_x - 1
+                        if big_x < len(msg_string) * -5:
+                            big_x = 64
+                            rotate = True
                 
                 # display the clock
                 canvas = self.matrix.SwapOnVSync(canvas)
                 
-                # so you can read the scrolling message
-                time.sleep(.06)
+                if idle:
+                    # only the clock is showing, so wake up at the start of the next frame
+                    frame_time = 1.0 / config.idle_frame_rate
+                    timesource.sleep(frame_time - (now.microsecond / 1000000.0) % frame_time)
+                else:
+                    # so you can read the scrolling message
+                    timesource.sleep(.06)
+
+                # load everything else once the clock is showing
+                if init and not booting:
+                    booting = True
+                    if config.fast_boot:
+                        threading.Thread(target=boot, daemon=True).start()
+                    else:
+                        boot()
 
-                if init:
-                    update_weather()
-                    update_markets()
-                    update_headlines()
+                if init and boot_done.is_set():
                     init = False
+
+                    # build each frame as one image when possible
+                    comp = self.setup_compositor(textColor)
                     
         except KeyboardInterrupt:
             print("Exiting\n")
-            tl.stop()
+            timesource.stop_jobs(tl)
             sys.exit(0)
 
+        timesource.stop_jobs(tl)
+
+
+@tl.job(interval=datetime.timedelta(minutes=config.memory_report_rate))
+def report_memory():
+    memwatch.report()
 
-@tl.job(interval=datetime.timedelta(minutes=config.weather_update_rate))        
-def update_weather():
-    print('\nweather updated @ {}'.format(datetime.datetime.now().astimezone()))
-    w = Weather()
-    w.get_weather(qw)
 
+@tl.job(interval=datetime.timedelta(seconds=config.config_reload_rate))
+def reload_config():
+    """
+    Reload config.py when it is saved and apply the changes without restarting.
+    """
+
+    global config_mtime, config_error
+    try:
+        mtime = os.path.getmtime(config.__file__)
+        if mtime == config_mtime:
+            return
+
+        # load the file on its own first, so a mistake in it can't leave half the
+        # new settings in use
+        spec = importlib.util.spec_from_file_location('config', config.__file__)
+        settings = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(settings)
+
+        changed = {name for name, value in vars(settings).items()
+                   if not name.startswith('_') and (not hasattr(config, name) or getattr(config, name) != value)}
+        check_config(settings, changed)
+    except Exception as ex:
+        # keep running with the settings already loaded, and try again until the file is fixed
+        error = 'Config error: {}'.format(ex)
+        if error != config_error:
+            print(error)
+        config_error = error
+        return
+
+    config_mtime = mtime
+    config_error = None
+    if not changed:
+        return
+
+    for name in changed:
+        setattr(config, name, getattr(settings, name))
+    print('\nconfig reloaded @ {}: {}'.format(timesource.now().astimezone(), ', '.join(sorted(changed))))
+    try:
+        apply_config(changed)
+    except Exception as ex:
+        # the job would stop for good
+        print('Config error: {}'.format(ex))
+
+
+def check_config(settings, changed):
+    """
+    Raise ValueError for a setting that would stop the clock (settings is a loaded
+    config.py). The font files are only checked when font_dir changed.
+    """
+
+    def is_number(value):
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+    def is_color(value):
+        return (isinstance(value, (tuple, list)) and len(value) == 3
+                and all(isinstance(part, int) and 0 <= part <= 255 for part in value))
+
+    # numbers of minutes or seconds, and frames per second
+    for name in ('weather_update_rate', 'market_update_rate', 'news_update_rate', 'memory_report_rate',
+                 'config_reload_rate', 'idle_frame_rate'):
+        value = getattr(settings, name, None)
+        if not is_number(value) or value <= 0:
+            raise ValueError('{} must be a number above 0, not {!r}'.format(name, value))
+    if not is_number(getattr(settings, 'face_flip_rate', None)) or settings.face_flip_rate < 0:
+        raise ValueError('face_flip_rate must be a number of seconds, not {!r}'.format(getattr(settings, 'face_flip_rate', None)))
+
+    # whole numbers, from low to high
+    for name, low, high in (('source_max_workers', 1, 64), ('alert_point_precision', 0, 4),
+                            ('spark_width', 0, 64), ('market_history_size', 2, 100000),
+                            ('quiet_hours_start', 0, 23), ('quiet_hours_end', 0, 23),
+                            ('idle_brightness', 1, 100), ('brightness_ramp_step', 1, 100),
+                            ('face_fade_frames', 0, 1000)):
+        value = getattr(settings, name, None)
+        if not isinstance(value, int) or isinstance(value, bool) or not low <= value <= high:
+            raise ValueError('{} must be a whole number from {} to {}, not {!r}'.format(name, low, high, value))
+
+    for name in ('weather_locations', 'symbols'):
+        if not isinstance(getattr(settings, name, None), (list, tuple)):
+            raise ValueError('{} must be a list, not {!r}'.format(name, getattr(settings, name, None)))
+
+    if not is_color(getattr(settings, 'alert_color', None)):
+        raise ValueError('alert_color must be (red, green, blue), not {!r}'.format(getattr(settings, 'alert_color', None)))
+    time_gradient = getattr(settings, 'time_gradient', None)
+    if time_gradient is not None and not (isinstance(time_gradient, (tuple, list)) and len(time_gradient) == 2
+                                          and all(is_color(color) for color in time_gradient)):
+        raise ValueError('time_gradient must be None or two (red, green, blue) colors, not {!r}'.format(time_gradient))
+
+    if 'font_dir' in changed:
+        for font_file in ('5x7.bdf', '7x13.bdf'):
+            if not os.path.isfile(os.path.join(str(settings.font_dir), font_file)):
+                raise ValueError('font_dir has no {}: {!r}'.format(font_file, settings.font_dir))
+
+
+def apply_config(changed):
+    """
+    Apply changed config settings: reschedule jobs, fetch only what the changes affect,
+    and tell the renderer what to redraw.
+    """
+
+    # new intervals take effect from the next run of each job
+    runner.reschedule(changed)
+    rates = {'memory_report_rate': (report_memory, 'minutes'), 'config_reload_rate': (reload_config, 'seconds')}
+    for name in changed & set(rates):
+        execute, unit = rates[name]
+        for job in tl.jobs:
+            if job.execute is execute:
+                job.interval = datetime.timedelta(**{unit: getattr(config, name)})
+
+    if 'memory_tracking' in changed:
+        if config.memory_tracking:
+            memwatch.enable()
+        else:
+            memwatch.disable()
 
-@tl.job(interval=datetime.timedelta(minutes=config.market_update_rate))        
-def update_markets():
-    print('\nmarkets updated @ {}'.format(datetime.datetime.now().astimezone()))
-    m = Market()
-    m.get_markets(qm)
+    if 'source_max_workers' in changed:
+        runner.resize(config.source_max_workers)
 
+    # the renderer redraws what changed
+    qc.put(changed)
 
-@tl.job(interval=datetime.timedelta(minutes=config.news_update_rate))        
-def update_headlines():
-    print('\nheadlines updated @ {}'.format(datetime.datetime.now().astimezone()))
-    h = Headlines()
-    h.get_headlines(qh)    
+    # update only the sources the changes affect, without holding up the next reload
+    for name, source in runner.sources.items():
+        options = source.reconfigure(changed)
+        if options is not None:
+            runner.submit(name, **options)
 
 
 if __name__ == '__main__':
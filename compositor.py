@@ -0,0 +1,208 @@
+"""
+(C) MS Roth 2020-2023
+Frame compositor for the LED clock.
+
+Instead of a graphics.DrawText call per line per frame, each frame is built in one
+numpy RGB buffer and handed to the canvas with a single SetImage call. Text is
+rasterized from the BDF fonts once per string and cached, and the scrolling ticker
+is rasterized once per message, so a frame is only a handful of array copies.
+Building the frame in an array also allows per-pixel effects: a color gradient on
+the time, fading between the day of week and date faces, and alerts highlighted in
+the ticker.
+
+Needs numpy and Pillow. If they aren't installed, available is False and the
+clock draws with graphics.DrawText.
+"""
+
+import re
+
+try:
+    import numpy
+    from PIL import Image
+    available = True
+except ImportError:
+    available = False
+
+import bdf
+
+# most strings the clock draws are repeated every frame (or every second)
+MASK_CACHE_SIZE = 64
+
+
+class Compositor:
+    def __init__(self, width, height, font_file, time_font_file, text_color):
+        self.width = width
+        self.height = height
+        self.font = bdf.BdfFont(font_file)
+        self.time_font = bdf.BdfFont(time_font_file)
+        self.text_color = numpy.array(text_color, dtype=numpy.uint16).reshape(1, 1, 3)
+        self.time_colors = self.text_color
+        self.alert_color = numpy.array(text_color, dtype=numpy.uint16)
+        self.masks = {}
+
+        # frame is what gets displayed, face is the clock part of it (for fading)
+        self.frame = numpy.zeros((height, width, 3), dtype=numpy.uint8)
+        self.face = numpy.zeros((height, width, 3), dtype=numpy.uint16)
+        self.old_face = numpy.zeros((height, width, 3), dtype=numpy.uint16)
+        self.last_face = None
+        self.fade_from = None
+        self.fade_frames = 0
+        self.fade_step = 0
+
+        self.ticker = numpy.zeros((self.font.height, 0, 3), dtype=numpy.uint8)
+
+    def set_time_gradient(self, top, bottom):
+        """
+        Color the time with a vertical gradient from top to bottom.
+        """
+
+        rows = self.time_font.height
+        ramp = numpy.linspace(0.0, 1.0, rows).reshape(rows, 1, 1)
+        top = numpy.array(top, dtype=float).reshape(1, 1, 3)
+        bottom = numpy.array(bottom, dtype=float).reshape(1, 1, 3)
+        self.time_colors = (top + (bottom - top) * ramp).round().astype(numpy.uint16)
+
+    def set_alert_color(self, color):
+        self.alert_color = numpy.array(color, dtype=numpy.uint16)
+
+    def text_mask(self, font, text):
+        """
+        Return a (font height x text width) array that is 1 where the text has pixels,
+        and the x position where each character starts.
+        """
+
+        key = (id(font), text)
+        cached = self.masks.get(key)
+        if cached is not None:
+            return cached
+
+        starts = []
+        x = 0
+        for char in text:
+            starts.append(x)
+            glyph = font.glyph(char)
+            if glyph is not None:
+                x += glyph.width
+        starts.append(x)
+
+        mask = numpy.zeros((font.height, max(x, 1)), dtype=numpy.uint8)
+        for char, x in zip(text, starts):
+            glyph = font.glyph(char)
+            if glyph is None or not glyph.rows:
+                continue
+            # unpack the glyph rows into bits, then place the glyph box on the baseline
+            bits = numpy.array([[(row >> (glyph.bbx_width - 1 - i)) & 1 for i in range(glyph.bbx_width)]
+                                for row in glyph.rows], dtype=numpy.uint8)
+            top = font.ascent - glyph.y_offset - glyph.bbx_height
+            left = x + glyph.x_offset
+            y0, x0 = max(top, 0), max(left, 0)
+            y1 = min(top + glyph.bbx_height, mask.shape[0])
+            x1 = min(left + glyph.bbx_width, mask.shape[1])
+            if y0 < y1 and x0 < x1:
+                mask[y0:y1, x0:x1] |= bits[y0 - top:y1 - top, x0 - left:x1 - left]
+
+        if len(self.masks) >= MASK_CACHE_SIZE:
+            self.masks.clear()
+        self.masks[key] = (mask, starts)
+        return mask, starts
+
+    def blit(self, layer, image, x, y):
+        """
+        Copy the part of image that lands on the layer with its top left corner at x, y.
+        """
+
+        height, width = image.shape[:2]
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + width, self.width), min(y + height, self.height)
+        if x0 < x1 and y0 < y1:
+            region = layer[y0:y1, x0:x1]
+            numpy.maximum(region, image[y0 - y:y1 - y, x0 - x:x1 - x], out=region, casting='unsafe')
+
+    def draw_text(self, layer, font, x, y, colors, text):
+        """
+        Draw text with its baseline at y, like graphics.DrawText.
+        """
+
+        mask = self.text_mask(font, text)[0]
+        self.blit(layer, mask[:, :, None] * colors, x, y - font.ascent)
+
+    def set_ticker(self, text):
+        """
+        Rasterize the whole ticker message, with weather alerts ("! event !") in the alert color.
+        """
+
+        mask, starts = self.text_mask(self.font, text)
+        colors = numpy.empty((1, mask.shape[1], 3), dtype=numpy.uint16)
+        colors[:] = self.text_color
+        for alert in re.finditer(r'! [^!]+ !', text):
+            colors[0, starts[alert.start()]:starts[alert.end()]] = self.alert_color
+        self.ticker = (mask[:, :, None] * colors).astype(numpy.uint8)
+
+        # the message is drawn once here, so it doesn't need to stay in the cache
+        self.masks.pop((id(self.font), text), None)
+
+    def ticker_width(self):
+        return self.ticker.shape[1]
+
+    def flip_face(self, frames):
+        """
+        Fade from the face on screen to the next one over the given number of frames.
+        """
+
+        if frames > 0 and self.last_face is not None:
+            self.fade_from = self.last_face
+            self.fade_frames = frames
+            self.fade_step = 0
+
+    def draw_face(self, time_string, time_pos, date_string, date_pos):
+        self.last_face = (time_string, time_pos, date_string, date_pos)
+        self.face.fill(0)
+        self.draw_text(self.face, self.time_font, time_pos, 11, self.time_colors, time_string)
+        self.draw_text(self.face, self.font, date_pos, 20, self.text_color, date_string)
+
+        if self.fade_from is None:
+            self.frame[:] = self.face
+            return
+
+        # cross fade from the old face
+        self.fade_step += 1
+        alpha = self.fade_step * 256 // (self.fade_frames + 1)
+        self.old_face.fill(0)
+        old_time, old_time_pos, old_date, old_date_pos = self.fade_from
+        self.draw_text(self.old_face, self.time_font, old_time_pos, 11, self.time_colors, old_time)
+        self.draw_text(self.old_face, self.font, old_date_pos, 20, self.text_color, old_date)
+        self.face *= alpha
+        self.old_face *= 256 - alpha
+        self.face += self.old_face
+        self.face >>= 8
+        self.frame[:] = self.face
+        if self.fade_step >= self.fade_frames:
+            self.fade_from = None
+
+    def draw_ticker(self, x, y):
+        self.blit(self.frame, self.ticker, x, y - self.font.ascent)
+
+    def draw_message(self, x, y, text):
+        self.draw_text(self.frame, self.font, x, y, self.text_color, text)
+
+    def draw_points(self, points, x, y, color):
+        """
+        Set the (dx, dy) points offset by x, y to color, skipping any off the frame.
+        """
+
+        if not points:
+            return
+        points = numpy.asarray(points)
+        xs = points[:, 0] + x
+        ys = points[:, 1] + y
+        visible = (xs >= 0) & (xs < self.width) & (ys >= 0) & (ys < self.height)
+        self.frame[ys[visible], xs[visible]] = color
+
+    def show(self, canvas):
+        """
+        Copy the frame to the canvas in one call.
+        """
+
+        canvas.SetImage(Image.fromarray(self.frame, 'RGB'), 0, 0)
+
+#<SDG><
@@ -2,6 +2,12 @@
 # http://bulk.openweathermap.org/sample/
 # Manassas 20111
 weather_city = 20111
+# zip codes to rotate through on the ticker
+weather_locations = [weather_city]
+# most requests the data sources make at once (they share them)
+source_max_workers = 4
+# decimal places to round locations to, so nearby ones share one alerts lookup (1 is about 10km)
+alert_point_precision = 1
 # where to get weather key?
 weather_api_key = '2ec33ce45f88dfcf30961aaf6bc2a0b7'
 # number of minutes between weather updates
@@ -10,6 +16,13 @@ weather_update_rate = 5
 symbols=['AAPL', 'AMZN', 'GOOGL', 'MSFT', 'TSLA', 'HD', 'PEP']
 # number of minutes between market updates
 market_update_rate = 3
+# draw intraday sparklines (spark_width pixels wide) next to each symbol
+sparklines = True
+spark_width = 12
+# prices kept per symbol for the sparklines (130 covers a trading day at 3 minute updates)
+market_history_size = 130
+# closing quotes are kept here while the market is closed (None to keep them in memory only)
+market_cache_file = 'market_cache.json'
 # number of seconds between time format changes
 face_flip_rate = 5
 # News API key
@@ -20,3 +33,32 @@ news_update_rate = 10
 # https://newsapi.org/docs/endpoints/sources
 news_source = 'breitbart-news'
 
+# hours (24-hour clock) when the ticker pauses and the display dims, off while both
+# are the same hour; e.g., 23 and 6 for 11pm to 6am
+quiet_hours_start = 0
+quiet_hours_end = 0
+# set to False to show only the clock
+ticker_enabled = True
+# brightness (1-100) and frames per second while idle (quiet hours or ticker disabled)
+idle_brightness = 20
+idle_frame_rate = 1
+# brightness change per frame when dimming or brightening
+brightness_ramp_step = 5
+# track memory use and print a report every memory_report_rate minutes
+# toggle while running with: sudo kill -USR1 <pid>
+memory_tracking = False
+memory_report_rate = 60
+# directory with the 5x7.bdf and 7x13.bdf fonts
+font_dir = '/home/pi/mlb-led-scoreboard/submodules/matrix/fonts'
+# build each frame as one image (needs numpy and Pillow), which allows the effects below
+compositor = True
+# top and bottom colors for the time, e.g. ((255, 235, 59), (255, 152, 0)), or None for plain text
+time_gradient = None
+# frames to fade between the day of week and date faces (0 switches instantly)
+face_fade_frames = 8
+# color for weather alerts in the ticker
+alert_color = (244, 67, 54)
+# show the clock right away and load the data sources in the background
+fast_boot = True
+# number of seconds between checks for changes to this file, which are applied without a restart
+config_reload_rate = 10
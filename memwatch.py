@@ -0,0 +1,166 @@
+"""
+(C) MS Roth 2020-2023
+Memory tracking for long-running clocks.
+
+Tracking is off until turned on in config.py (memory_tracking) or toggled at runtime
+with SIGUSR1 (sudo kill -USR1 <pid>). While it is on, tracemalloc runs, the RSS and
+Python allocation growth during each update is charged to that subsystem (weather,
+markets, headlines), and report() prints the biggest allocation changes since the
+last report. Growth outside the updates (the render loop, the interpreter) is
+reported as "other".
+
+Updates run on their own timeloop threads, so attribution is approximate when two
+of them overlap.
+"""
+
+import contextlib
+import gc
+import resource
+import signal
+import sys
+import threading
+import tracemalloc
+
+import timesource
+
+enabled = False
+start_rss = 0
+last_snapshot = None
+subsystems = {}
+
+# held while tracking is turned on or off and while reporting, so SIGUSR1 can't stop
+# tracemalloc in the middle of a report
+lock = threading.Lock()
+
+# set by SIGUSR1, whose handler runs on the main thread (the render loop), so the
+# toggle is done on a thread of its own instead of waiting there for a report
+toggle_requested = threading.Event()
+
+
+def rss():
+    """
+    Return the resident set size of the process in bytes.
+    """
+
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * resource.getpagesize()
+    except OSError:
+        # peak rather than current, but the best there is off Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def usage():
+    """
+    Return (rss, python, blocks) after a garbage collection: the resident set size and
+    the traced Python allocations in bytes, and the number of allocated memory blocks.
+    Python allocations are 0 unless tracking is on.
+    """
+
+    gc.collect()
+    if not tracemalloc.is_tracing():
+        return rss(), 0, sys.getallocatedblocks()
+
+    # leave out tracemalloc's own bookkeeping, which grows with the number of allocations
+    return (rss() - tracemalloc.get_tracemalloc_memory(), tracemalloc.get_traced_memory()[0],
+            sys.getallocatedblocks())
+
+
+def enable():
+    global enabled, start_rss, last_snapshot
+    with lock:
+        if enabled:
+            return
+        tracemalloc.start()
+        subsystems.clear()
+        start_rss = rss() - tracemalloc.get_tracemalloc_memory()
+        last_snapshot = tracemalloc.take_snapshot()
+        enabled = True
+
+
+def disable():
+    global enabled, last_snapshot
+    with lock:
+        enabled = False
+        last_snapshot = None
+        tracemalloc.stop()
+
+
+def toggle():
+    if enabled:
+        disable()
+    else:
+        enable()
+    print('\nmemory tracking {}'.format('on' if enabled else 'off'))
+
+
+def request_toggle(signum=None, frame=None):
+    toggle_requested.set()
+
+
+def toggler():
+    while True:
+        toggle_requested.wait()
+        toggle_requested.clear()
+        toggle()
+
+
+def install_signal():
+    # must be called from the main thread
+    threading.Thread(target=toggler, daemon=True).start()
+    signal.signal(signal.SIGUSR1, request_toggle)
+
+
+@contextlib.contextmanager
+def track(name):
+    """
+    Charge the memory growth inside the with block to the named subsystem.
+    """
+
+    if not enabled:
+        yield
+        return
+
+    rss_before = rss()
+    traced_before = tracemalloc.get_traced_memory()[0]
+    try:
+        yield
+    finally:
+        if enabled:
+            with lock:
+                stats = subsystems.setdefault(name, [0, 0, 0])
+                stats[0] += 1
+                stats[1] += rss() - rss_before
+                stats[2] += tracemalloc.get_traced_memory()[0] - traced_before
+
+
+def report(limit=10):
+    """
+    Print memory use by subsystem and the top allocation changes since the last report.
+    """
+
+    global last_snapshot
+    with lock:
+        # tracking may have been turned off since the job was scheduled
+        if not enabled or not tracemalloc.is_tracing():
+            return
+
+        current_rss, traced, blocks = usage()
+        snapshot = tracemalloc.take_snapshot().filter_traces((tracemalloc.Filter(False, tracemalloc.__file__),))
+
+        print('\nmemory @ {}: rss {:.0f}KB ({:+.0f}KB), python {:.0f}KB (peak {:.0f}KB), {} blocks'.format(
+            timesource.now().astimezone(), current_rss / 1024, (current_rss - start_rss) / 1024,
+            traced / 1024, tracemalloc.get_traced_memory()[1] / 1024, blocks))
+
+        other = current_rss - start_rss
+        for name, (calls, rss_delta, traced_delta) in sorted(subsystems.items()):
+            other -= rss_delta
+            print('  {}: {} updates, rss {:+.0f}KB, python {:+.0f}KB'.format(name, calls,
+                                                                          rss_delta / 1024, traced_delta / 1024))
+        print('  other: rss {:+.0f}KB'.format(other / 1024))
+
+        for stat in snapshot.compare_to(last_snapshot, 'lineno')[:limit]:
+            print('  {}'.format(stat))
+        last_snapshot = snapshot
+
+#<SDG><
@@ -0,0 +1,131 @@
+"""
+(C) MS Roth 2020-2023
+Offscreen stand-in for the rgbmatrix module.
+
+Provides RGBMatrix, RGBMatrixOptions, and graphics with the calls the clock uses so
+it can run headless (see simulate.py). Canvases keep their pixels in memory and
+record the text drawn on them instead of rasterizing it.
+"""
+
+import os
+import re
+import types
+
+
+class RGBMatrixOptions:
+    def __init__(self):
+        self.rows = 32
+        self.cols = 32
+        self.chain_length = 1
+        self.parallel = 1
+        self.brightness = 100
+
+
+class FrameCanvas:
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.pixels = bytearray(width * height * 3)
+        self.texts = []
+
+    def Fill(self, red, green, blue):
+        self.pixels[:] = bytes((red, green, blue)) * (self.width * self.height)
+        self.texts = []
+
+    def Clear(self):
+        self.Fill(0, 0, 0)
+
+    def SetImage(self, image, offset_x=0, offset_y=0, unsafe=True):
+        # copy the part of each image row that lands on the canvas
+        image = image.convert('RGB')
+        data = image.tobytes()
+        x0 = max(offset_x, 0)
+        x1 = min(offset_x + image.width, self.width)
+        if x0 >= x1:
+            return
+        for y in range(max(offset_y, 0), min(offset_y + image.height, self.height)):
+            row = ((y - offset_y) * image.width + x0 - offset_x) * 3
+            i = (y * self.width + x0) * 3
+            self.pixels[i:i + (x1 - x0) * 3] = data[row:row + (x1 - x0) * 3]
+
+    def SetPixel(self, x, y, red, green, blue):
+        if 0 <= x < self.width and 0 <= y < self.height:
+            i = (y * self.width + x) * 3
+            self.pixels[i:i + 3] = bytes((red, green, blue))
+
+
+class RGBMatrix:
+    def __init__(self, options=None):
+        if options is None:
+            options = RGBMatrixOptions()
+        self.width = options.cols * options.chain_length
+        self.height = options.rows * options.parallel
+        self.brightness = options.brightness
+        self.swaps = 0
+
+    def CreateFrameCanvas(self):
+        return FrameCanvas(self.width, self.height)
+
+    def SwapOnVSync(self, canvas):
+        # nothing to display, hand back the canvas to draw the next frame on
+        self.swaps += 1
+        return canvas
+
+
+class Color:
+    def __init__(self, red=0, green=0, blue=0):
+        self.red = red
+        self.green = green
+        self.blue = blue
+
+
+class Font:
+    def __init__(self):
+        self.widths = {}
+        self.default_width = 5
+        self.height = 7
+        self.text_widths = {}
+
+    def LoadFont(self, file):
+        # fonts are named like 5x7.bdf, so fall back on that without the file
+        size = re.search(r'(\d+)x(\d+)', os.path.basename(file))
+        if size:
+            self.default_width = int(size.group(1))
+            self.height = int(size.group(2))
+        if not os.path.exists(file):
+            return
+
+        with open(file, encoding='latin-1') as bdf:
+            encoding = None
+            for line in bdf:
+                if line.startswith('ENCODING'):
+                    encoding = int(line.split()[1])
+                elif line.startswith('DWIDTH') and encoding is not None:
+                    self.widths[encoding] = int(line.split()[1])
+
+    def CharacterWidth(self, char):
+        return self.widths.get(char, self.default_width)
+
+
+def DrawText(canvas, font, x, y, color, text):
+    canvas.texts.append((x, y, text))
+
+    # the same strings are redrawn every frame, so remember the last few widths
+    width = font.text_widths.get(text)
+    if width is None:
+        if len(font.text_widths) > 8:
+            font.text_widths.clear()
+        width = font.text_widths[text] = sum(font.CharacterWidth(ord(c)) for c in text)
+    return width
+
+
+def DrawLine(canvas, x1, y1, x2, y2, color):
+    steps = max(abs(x2 - x1), abs(y2 - y1), 1)
+    for i in range(steps + 1):
+        canvas.SetPixel(x1 + (x2 - x1) * i // steps, y1 + (y2 - y1) * i // steps,
+                        color.red, color.green, color.blue)
+
+
+graphics = types.SimpleNamespace(Color=Color, Font=Font, DrawText=DrawText, DrawLine=DrawLine)
+
+#<SDG><
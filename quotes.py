@@ -0,0 +1,189 @@
+"""
+(C) MS Roth 2020-2023
+Intraday quote history for the market ticker.
+
+Prices are kept in a preallocated array('f') ring buffer per symbol, so memory stays
+constant however many updates a trading day brings, and each symbol's sparkline is
+worked out once per new price instead of on every frame.
+
+The closing quotes are kept in a snapshot for the session (trading day) they close,
+in memory and on disk, so while the market is closed they are fetched once after
+the close instead of on every update, even across restarts.
+"""
+
+import json
+import os
+from array import array
+
+
+class PriceRing:
+    """
+    Fixed-size ring buffer of prices, oldest first.
+    """
+
+    __slots__ = ('prices', 'start', 'count')
+
+    def __init__(self, size):
+        self.prices = array('f', bytes(4 * size))
+        self.start = 0
+        self.count = 0
+
+    def append(self, price):
+        size = len(self.prices)
+        self.prices[(self.start + self.count) % size] = price
+        if self.count < size:
+            self.count += 1
+        else:
+            self.start = (self.start + 1) % size
+
+    def get(self, i):
+        return self.prices[(self.start + i) % len(self.prices)]
+
+    def clear(self):
+        self.start = 0
+        self.count = 0
+
+
+class QuoteHistory:
+    """
+    Price history and sparklines for each symbol. History starts over each session
+    (trading day).
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.session = None
+        self.rings = {}
+        self.sparks = {}
+
+    def append(self, symbol, price, session):
+        if session != self.session:
+            self.session = session
+            for ring in self.rings.values():
+                ring.clear()
+            self.sparks.clear()
+
+        if symbol not in self.rings:
+            self.rings[symbol] = PriceRing(self.size)
+        self.rings[symbol].append(price)
+        self.sparks.pop(symbol, None)
+
+    def resize(self, size):
+        """
+        Change the number of prices kept, keeping the latest ones.
+        """
+
+        for symbol, ring in self.rings.items():
+            resized = PriceRing(size)
+            for i in range(max(ring.count - size, 0), ring.count):
+                resized.append(ring.get(i))
+            self.rings[symbol] = resized
+        self.size = size
+        self.sparks.clear()
+
+    def remove(self, symbol):
+        self.rings.pop(symbol, None)
+        self.sparks.pop(symbol, None)
+
+    def sparkline(self, symbol, width, height):
+        """
+        Return (points, up) for the symbol's sparkline, where points are (x, y) pixel
+        offsets in a width x height box and up is True if the price is up on the day.
+        Empty until there are two prices, or if the box is less than 2 pixels wide.
+        """
+
+        if width < 2 or height < 1:
+            return (), True
+
+        # cached with its size, so a new spark_width is drawn right away
+        cached = self.sparks.get(symbol)
+        if cached is not None and cached[:2] == (width, height):
+            return cached[2]
+
+        ring = self.rings.get(symbol)
+        if ring is None or ring.count < 2:
+            return (), True
+
+        # sample the whole session evenly across the width
+        columns = min(width, ring.count)
+        samples = [ring.get(i * (ring.count - 1) // (columns - 1)) for i in range(columns)]
+        low = min(samples)
+        high = max(samples)
+
+        points = []
+        last_y = None
+        for x, price in enumerate(samples):
+            if high > low:
+                y = height - 1 - int(round((price - low) / (high - low) * (height - 1)))
+            else:
+                y = height // 2
+
+            # fill in big moves so the line stays connected
+            if last_y is not None and abs(y - last_y) > 1:
+                step = 1 if y > last_y else -1
+                points.extend((x, fill_y) for fill_y in range(last_y + step, y, step))
+            points.append((x, y))
+            last_y = y
+
+        spark = (tuple(points), samples[-1] >= samples[0])
+        self.sparks[symbol] = (width, height, spark)
+        return spark
+
+
+class QuoteSnapshot:
+    """
+    Closing quotes of a session by symbol, saved to a JSON file (or only kept in
+    memory if file is None).
+    """
+
+    def __init__(self, file):
+        self.file = file
+        self.session = None
+        self.quotes = {}
+        self.loaded = False
+
+    def quotes_for(self, session):
+        """
+        Return a copy of the quotes if they are from the session (a date), else an empty dict.
+        """
+
+        if not self.loaded:
+            self.load()
+        if self.session != session.isoformat():
+            return {}
+        return dict(self.quotes)
+
+    def update(self, session, quotes):
+        """
+        Replace the snapshot with the quotes of the session, and save it.
+        """
+
+        self.session = session.isoformat()
+        self.quotes = dict(quotes)
+        if self.file is None:
+            return
+
+        # write a new file and swap it in, so a crash can't leave half a snapshot
+        try:
+            with open(self.file + '.tmp', 'w') as snapshot:
+                json.dump({'session': self.session, 'quotes': self.quotes}, snapshot)
+            os.replace(self.file + '.tmp', self.file)
+        except Exception as ex:
+            print('Quote snapshot error: {}'.format(ex))
+
+    def load(self):
+        self.loaded = True
+        if self.file is None or not os.path.exists(self.file):
+            return
+
+        try:
+            with open(self.file) as snapshot:
+                saved = json.load(snapshot)
+            quotes = {symbol: tuple(quote) for symbol, quote in saved['quotes'].items()}
+            self.session = saved['session']
+            self.quotes = quotes
+        except Exception as ex:
+            # fetch the quotes again
+            print('Quote snapshot error: {}'.format(ex))
+
+#<SDG><
@@ -0,0 +1,269 @@
+"""
+(C) MS Roth 2020-2023
+Fast-forward the LED clock through simulated time.
+
+Runs clock4 headless against an offscreen canvas with a simulated clock and
+recorded (or canned) weather, market, and news responses, so a day or weeks of
+face flips, market opens and closes, holidays, and weather alerts play out in
+seconds or minutes.
+
+    python3 simulate.py --days 1
+    python3 simulate.py --start 2023-07-03T00:00 --days 14 --fixtures fixtures/
+    python3 simulate.py --record fixtures/      # save live responses as fixtures
+
+As a soak test, --max-growth-kb exits with status 1 if the RSS grows by more than
+that after the warmup. With --trace, memory tracking and its hourly reports are on
+and the limit applies to the traced Python allocations instead, since tracemalloc's
+own tables inflate the RSS:
+
+    python3 simulate.py --days 7 --quiet --max-growth-kb 512
+    python3 simulate.py --days 1 --quiet --max-growth-kb 64 --trace
+
+"""
+
+import argparse
+import datetime
+import json
+import os
+import re
+import sys
+import time
+import urllib.parse
+
+import offscreen
+
+# the clock draws on offscreen canvases, even on a Pi
+sys.modules['rgbmatrix'] = offscreen
+
+import clock4
+import config
+import memwatch
+import quotes
+import timesource
+
+
+class FixtureResponse:
+    def __init__(self, data):
+        self.data = data
+        self.status_code = 200
+        self.text = json.dumps(data)
+
+    def json(self):
+        return self.data
+
+
+class FixtureSession:
+    """
+    Stands in for clock4.session and answers requests from fixture files named for
+    the endpoint (weather.json, group.json, forecast.json, alerts.json,
+    headlines.json, chart_AAPL.json, ...). Endpoints without a fixture get canned data.
+    """
+
+    def __init__(self, fixtures_dir=None, record_dir=None):
+        self.fixtures_dir = fixtures_dir
+        self.record_dir = record_dir
+        self.fixtures = {}
+        self.requests = 0
+
+    def fixture_name(self, url):
+        parts = urllib.parse.urlparse(url)
+        if parts.netloc == 'api.weather.gov':
+            return 'alerts'
+        elif 'openweathermap' in parts.netloc:
+            return parts.path.rsplit('/', 1)[-1]
+        elif 'newsapi' in parts.netloc:
+            return 'headlines'
+        elif 'finance.yahoo' in parts.netloc:
+            symbol = urllib.parse.unquote_plus(parts.path.rsplit('/', 1)[-1])
+            return 'chart_' + re.sub(r'\W', '', symbol)
+        return re.sub(r'\W', '_', parts.netloc + parts.path)
+
+    def get(self, url, **kwargs):
+        self.requests += 1
+        name = self.fixture_name(url)
+
+        if self.record_dir is not None:
+            import requests
+            response = requests.get(url, **kwargs)
+            with open(os.path.join(self.record_dir, name + '.json'), 'w') as f:
+                json.dump(response.json(), f, indent=2)
+            return response
+
+        if name not in self.fixtures and self.fixtures_dir is not None:
+            path = os.path.join(self.fixtures_dir, name + '.json')
+            if os.path.exists(path):
+                with open(path) as f:
+                    self.fixtures[name] = json.load(f)
+        if name in self.fixtures:
+            return FixtureResponse(self.fixtures[name])
+        return FixtureResponse(self.canned(name, url))
+
+    def city(self, zip_code):
+        return {'id': 4000000 + int(zip_code), 'name': 'Zip {}'.format(zip_code),
+                'coord': {'lat': 38.75 + (int(zip_code) % 100) / 100.0, 'lon': -77.48},
+                'main': {'temp': 72.4, 'feels_like': 71.8, 'humidity': 55},
+                'wind': {'deg': 200, 'speed': 6.2}, 'weather': [{'description': 'clear sky'}]}
+
+    def canned(self, name, url):
+        """
+        Built-in responses, with prices that drift and an alert that comes and goes.
+        """
+
+        now = timesource.now().astimezone()
+        query = urllib.parse.parse_qs(urllib.parse.urlparse(url).query)
+        if name == 'weather':
+            return self.city(query['zip'][0].split(',')[0])
+        elif name == 'group':
+            cities = [self.city(int(city_id) - 4000000) for city_id in query['id'][0].split(',')]
+            return {'cnt': len(cities), 'list': cities}
+        elif name == 'forecast':
+            return {'list': [{'weather': [{'description': 'few clouds'}]}] * 3}
+        elif name == 'alerts':
+            # a three hour alert starting at 3pm every day
+            onset = now.replace(hour=15, minute=0, second=0, microsecond=0)
+            if not onset <= now < onset + datetime.timedelta(hours=3):
+                return {'features': []}
+            return {'features': [{'id': 'urn:oid:sim.{}'.format(onset.date()),
+                                  'properties': {'id': 'urn:oid:sim.{}'.format(onset.date()),
+                                                 'event': 'Heat Advisory', 'severity': 'Moderate',
+                                                 'effective': onset.isoformat(), 'onset': onset.isoformat(),
+                                                 'ends': (onset + datetime.timedelta(hours=3)).isoformat()}}]}
+        elif name == 'headlines':
+            return {'totalResults': 5,
+                    'articles': [{'title': 'Simulated headline {} for {}'.format(i + 1, now.date())} for i in range(5)]}
+        elif name.startswith('chart_'):
+            drift = (self.requests % 40 - 20) / 8.0
+            return {'chart': {'result': [{'meta': {'chartPreviousClose': 100.0,
+                                                   'regularMarketPrice': 100.0 + drift,
+                                                   'regularMarketTime': int(now.timestamp())}}]}}
+        return {}
+
+
+class Recorder:
+    """
+    Watches the frames the clock swaps onto the offscreen matrix and logs changes.
+    """
+
+    def __init__(self, matrix, quiet=False, warmup=None):
+        self.matrix = matrix
+        self.quiet = quiet
+        self.warmup = warmup
+        self.baseline = None
+        self.frames = 0
+        self.flips = 0
+        self.events = 0
+        self.face = None
+        self.state = {}
+        self.swap = matrix.SwapOnVSync
+        matrix.SwapOnVSync = self.on_swap
+
+    def log(self, key, value):
+        if self.state.get(key) != value:
+            self.state[key] = value
+            self.events += 1
+            if not self.quiet:
+                print('{}  {}: {}'.format(timesource.now().strftime('%Y-%m-%d %H:%M:%S'), key, value))
+
+    def on_swap(self, canvas):
+        self.frames += 1
+        texts = {y: text for x, y, text in canvas.texts}
+
+        # the date line switches between the day of week and the full date
+        face = ',' in texts.get(20, '')
+        if face != self.face:
+            self.face = face
+            self.flips += 1
+
+        ticker = texts.get(30, '')
+        if 'Markets are closed' in ticker:
+            self.log('market', 'closed')
+        elif 'Market update' in ticker:
+            self.log('market', 'open')
+        if ticker and 'Loading' not in ticker:
+            self.log('alert', 'active' if '! ' in ticker else 'none')
+        self.log('brightness', self.matrix.brightness)
+
+        # take the soak test baseline once caches and connections have warmed up
+        if self.warmup is not None and self.baseline is None and timesource.now() >= self.warmup:
+            self.baseline = memwatch.usage()
+        return self.swap(canvas)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fast-forward the LED clock through simulated time.')
+    parser.add_argument('--start', help='Simulated start time, e.g. 2023-07-03T00:00. Default: today at midnight', type=str)
+    parser.add_argument('--days', help='Number of days to simulate. Default: 1', default=1.0, type=float)
+    parser.add_argument('--fixtures', help='Directory of recorded JSON responses', type=str)
+    parser.add_argument('--record', help='Fetch live responses and save them to this directory', type=str)
+    parser.add_argument('--quiet', help="Don't log each change", action='store_true')
+    parser.add_argument('--fonts', help='Directory with the 5x7.bdf and 7x13.bdf fonts. Default: config.font_dir', type=str)
+    parser.add_argument('--compositor', help='Build frames with the compositor (changes are only logged for drawn text)',
+                        action='store_true')
+    parser.add_argument('--max-growth-kb', help='Track memory and fail if it grows by more than this', type=int)
+    parser.add_argument('--warmup', help='Hours to run before the memory baseline. Default: 1', default=1.0, type=float)
+    parser.add_argument('--trace', help='Turn on memory tracking and limit the Python allocation growth', action='store_true')
+    args = parser.parse_args()
+
+    if args.start:
+        start = datetime.datetime.fromisoformat(args.start)
+    else:
+        start = datetime.datetime.combine(datetime.date.today(), datetime.time())
+    end = start + datetime.timedelta(days=args.days)
+
+    timesource.use(timesource.SimulatedTime(start, end))
+    config.compositor = args.compositor
+
+    # load the data sources in line so runs are repeatable
+    config.fast_boot = False
+    if args.fonts:
+        config.font_dir = args.fonts
+    clock4.session = FixtureSession(args.fixtures, args.record)
+
+    # keep the closing quotes in memory, so runs don't depend on earlier ones
+    config.market_cache_file = None
+    clock4.market.snapshot = quotes.QuoteSnapshot(None)
+
+    options = offscreen.RGBMatrixOptions()
+    options.rows = 32
+    options.cols = 64
+    options.brightness = 50
+
+    clock = clock4.Clock()
+    clock.matrix = offscreen.RGBMatrix(options=options)
+    warmup = None
+    if args.max_growth_kb is not None:
+        warmup = start + datetime.timedelta(hours=args.warmup)
+    if args.trace:
+        memwatch.enable()
+    recorder = Recorder(clock.matrix, args.quiet, warmup)
+
+    wall_start = time.time()
+    clock.run()
+    wall_time = time.time() - wall_start
+
+    print('\nsimulated {} to {} in {:.1f}s ({:.0f}x)'.format(start, end, wall_time,
+                                                            (end - start).total_seconds() / max(wall_time, 0.001)))
+    print('{} frames, {} face flips, {} changes, {} requests'.format(recorder.frames, recorder.flips,
+                                                                   recorder.events, clock4.session.requests))
+    for name in clock4.runner.sources:
+        print(clock4.runner.summary(name))
+
+    if args.max_growth_kb is not None:
+        if recorder.baseline is None:
+            print('soak test too short to pass the {}h warmup'.format(args.warmup))
+            sys.exit(1)
+        final = memwatch.usage()
+        memwatch.report()
+        growth = [(final[i] - recorder.baseline[i]) / 1024 for i in range(2)]
+        print('memory growth after warmup: rss {:+.0f}KB, python {:+.0f}KB, {:+d} blocks (limit {}KB)'.format(
+            growth[0], growth[1], final[2] - recorder.baseline[2], args.max_growth_kb))
+        if growth[1 if args.trace else 0] > args.max_growth_kb:
+            print('FAILED: memory grew more than {}KB'.format(args.max_growth_kb))
+            sys.exit(1)
+    return recorder
+
+
+if __name__ == '__main__':
+    main()
+
+#<SDG><
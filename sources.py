@@ -0,0 +1,308 @@
+"""
+(C) MS Roth 2020-2023
+Data sources for the ticker, and the runner that updates them.
+
+A source only says how to get its data and what to show, in three stages:
+
+    fetch(fetcher, **options)  get the raw data with fetcher.get() and fetcher.get_all()
+    parse(raw)                 pick out what is shown, as tuples, strings, and numbers
+    format(payload)            return the ticker texts for it (more than one rotate)
+
+The runner does the rest for every source: it schedules the updates on the timeloop,
+makes the requests on one shared HTTP session and thread pool, only formats and
+publishes when the parsed data changed, parses the last data again when the source
+says it has gone stale, keeps showing the last texts when an update fails, and keeps
+count of the requests and the time spent in each stage.
+
+To add a source (e.g., transit or sports), subclass Source, set its name and the
+config setting with its update rate, and add it to the sources in clock4.py.
+"""
+
+import concurrent.futures
+import datetime
+import threading
+import time
+
+import changes
+import config
+import memwatch
+import timesource
+
+HEADERS = {'User-Agent': 'LED-Clock'}
+
+# seconds to wait for a server before giving up on a request, so a hung connection
+# can't hold up its source's updates
+REQUEST_TIMEOUT = 15
+
+# seconds between checks for data that went stale between updates
+EXPIRY_CHECK_RATE = 30
+
+
+class Source:
+    # used for the queue, the metrics, and the memory tracking
+    name = ''
+
+    # config setting with the number of minutes between updates
+    rate = ''
+
+    # config settings that need a new update when they change
+    settings = ()
+
+    # shown until the first update
+    placeholder = ''
+
+    # set by parse to when the parsed data goes stale without a new fetch (e.g., when
+    # an alert ends), as a timezone aware datetime, or None
+    expires = None
+
+    def fetch(self, fetcher, **options):
+        raise NotImplementedError
+
+    def parse(self, raw):
+        return raw
+
+    def format(self, payload):
+        raise NotImplementedError
+
+    def reconfigure(self, changed):
+        """
+        Return the options for an update after the changed config settings, or None if
+        the source doesn't need one.
+        """
+
+        if changed & set(self.settings):
+            return {}
+        return None
+
+
+class Fetcher:
+    """
+    What a source fetches with during one update: the shared HTTP session and pool.
+    """
+
+    def __init__(self, runner):
+        self.runner = runner
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def get(self, url):
+        """
+        Return the JSON response to a GET request.
+        """
+
+        with self.lock:
+            self.requests += 1
+        return self.runner.session.get(url, headers=HEADERS, verify=False, timeout=REQUEST_TIMEOUT).json()
+
+    def get_all(self, urls):
+        """
+        Return the JSON responses to GET requests made at the same time, in order. A
+        request that fails gives {'error': message} in its place, so the others can
+        still be used.
+        """
+
+        return list(self.runner.pool.map(self.try_get, urls))
+
+    def try_get(self, url):
+        try:
+            return self.get(url)
+        except Exception as ex:
+            return {'error': '{}'.format(ex)}
+
+
+class Stats:
+    __slots__ = ('runs', 'errors', 'requests', 'parses', 'fetch_time', 'parse_time', 'format_time')
+
+    def __init__(self):
+        self.runs = 0
+        self.errors = 0
+        self.requests = 0
+        self.parses = 0
+        self.fetch_time = 0.0
+        self.parse_time = 0.0
+        self.format_time = 0.0
+
+
+class SourceRunner:
+    """
+    Runs the sources' updates on the timeloop and puts (name, fingerprint, texts) in
+    the queue when their data changes. setup is called before each update (e.g., to
+    import modules).
+    """
+
+    def __init__(self, queue, tl, max_workers, setup=None):
+        self.queue = queue
+        self.tl = tl
+        self.setup = setup
+        self.session = None
+        self.pool = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+        self.tracker = changes.ChangeTracker()
+        self.sources = {}
+        self.updaters = {}
+        self.stats = {}
+        self.texts = {}
+        self.locks = {}
+
+        # raw data of each source's last fetch, to parse again when it goes stale
+        self.raw = {}
+        tl.job(interval=datetime.timedelta(seconds=EXPIRY_CHECK_RATE))(self.expire)
+
+    def add(self, source):
+        """
+        Add a source to the ticker (after the ones already added) and schedule its updates.
+        """
+
+        def update(**options):
+            self.run(source, **options)
+
+        self.sources[source.name] = source
+        self.updaters[source.name] = update
+        self.stats[source.name] = Stats()
+        self.texts[source.name] = (source.placeholder,)
+        self.locks[source.name] = threading.Lock()
+        self.tl.job(interval=datetime.timedelta(minutes=getattr(config, source.rate)))(update)
+
+    def update(self, name, **options):
+        """
+        Update the named source now, e.g., on start up or after a config change.
+        """
+
+        self.updaters[name](**options)
+
+    def submit(self, name, **options):
+        """
+        Update the named source on a thread of its own, so the caller doesn't wait for
+        it (e.g., the config reload job).
+        """
+
+        threading.Thread(target=self.updaters[name], kwargs=options, daemon=True).start()
+
+    def run(self, source, **options):
+        # a source's updates can come from its job, start up, config reloads, and
+        # expiry, but only one runs at a time, so the source's state needs no locking
+        # of its own
+        with self.locks[source.name]:
+            print('\n{} updated @ {}'.format(source.name, timesource.now().astimezone()))
+            if self.setup is not None:
+                self.setup()
+
+            stats = self.stats[source.name]
+            fetcher = Fetcher(self)
+            with memwatch.track(source.name):
+                try:
+                    started = time.perf_counter()
+                    raw = source.fetch(fetcher, **options)
+                    stats.fetch_time += time.perf_counter() - started
+                except Exception as ex:
+                    self.failed(source, ex)
+                    return
+                finally:
+                    stats.runs += 1
+                    stats.requests += fetcher.requests
+
+                self.raw[source.name] = raw
+                self.publish(source, raw)
+
+    def expire(self):
+        """
+        Parse the last data again for the sources that said it would go stale by now (e.g.,
+        an alert ends), without fetching it again.
+        """
+
+        now = timesource.now(datetime.timezone.utc)
+        for name, source in self.sources.items():
+            if source.expires is None or source.expires > now or name not in self.raw:
+                continue
+
+            # an update that is running publishes newer data anyway, so don't wait for it
+            if not self.locks[name].acquire(blocking=False):
+                continue
+            try:
+                # or an update may have come first
+                if source.expires is not None and source.expires <= now:
+                    print('\n{} expired @ {}'.format(name, timesource.now().astimezone()))
+                    self.publish(source, self.raw[name])
+            finally:
+                self.locks[name].release()
+
+    def publish(self, source, raw):
+        """
+        Parse the raw data, and format and publish it if it changed.
+        """
+
+        stats = self.stats[source.name]
+        try:
+            started = time.perf_counter()
+            payload = source.parse(raw)
+            parsed = time.perf_counter()
+            stats.parses += 1
+            stats.parse_time += parsed - started
+
+            # nothing more to do if nothing changed
+            fingerprint = self.tracker.check(source.name, payload)
+            if fingerprint is None:
+                print(self.summary(source.name))
+                return
+
+            texts = tuple(source.format(payload))
+            stats.format_time += time.perf_counter() - parsed
+        except Exception as ex:
+            self.failed(source, ex)
+            return
+
+        # show the placeholder rather than nothing (e.g., no weather locations)
+        if not texts:
+            texts = (source.placeholder,)
+
+        for text in texts:
+            print(text)
+        self.texts[source.name] = texts
+        self.queue.put((source.name, fingerprint, texts))
+
+    def failed(self, source, ex):
+        # keep showing the last texts, and publish the next good update even if it's the same
+        self.tracker.forget(source.name)
+        self.stats[source.name].errors += 1
+        print('{} error: {}'.format(source.name.capitalize(), ex))
+
+    def reschedule(self, changed):
+        """
+        Apply changed update rates, from the next run of each job.
+        """
+
+        for name, source in self.sources.items():
+            if source.rate in changed:
+                for job in self.tl.jobs:
+                    if job.execute is self.updaters[name]:
+                        job.interval = datetime.timedelta(minutes=getattr(config, source.rate))
+
+    def resize(self, max_workers):
+        """
+        Change the number of requests made at the same time. Requests already started finish
+        on the old pool.
+        """
+
+        old = self.pool
+        self.pool = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+        old.shutdown(wait=False)
+
+    def summary(self, name):
+        """
+        Return how often the named source changed and what its updates cost.
+        """
+
+        stats = self.stats[name]
+        summary = self.tracker.summary(name, getattr(config, self.sources[name].rate))
+        if stats.runs:
+            summary += '; {:.1f} requests, fetch {:.1f}ms per update'.format(stats.requests / stats.runs,
+                                                                          1000 * stats.fetch_time / stats.runs)
+        if stats.parses:
+            summary += ', parse {:.1f}ms'.format(1000 * stats.parse_time / stats.parses)
+        changed = self.tracker.changes.get(name, 0)
+        if changed:
+            summary += ', format {:.1f}ms per change'.format(1000 * stats.format_time / changed)
+        if stats.errors:
+            summary += '; {} errors'.format(stats.errors)
+        return summary
+
+#<SDG><
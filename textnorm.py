@@ -0,0 +1,126 @@
+"""
+(C) MS Roth 2020-2023
+Text normalisation for the LED fonts.
+
+Headlines, city names, and the degree sign can have characters the BDF fonts don't
+have a glyph for, which rgbmatrix draws as blanks or boxes. The normalizer knows
+which characters the fonts cover and swaps the others for ones they do: curly quotes
+and dashes for plain ones, accented letters for the bare letter, and '?' when there
+is nothing close. Each incoming string is normalised once and kept in a small LRU
+cache, so the render loop only looks it up.
+"""
+
+import collections
+import unicodedata
+
+import bdf
+
+# enough for everything on the ticker and the date, with room to spare
+NORMALIZE_CACHE_SIZE = 32
+
+# what to use instead of common characters the fonts may not have
+SUBSTITUTES = {
+    '\u00a0': ' ',  # no-break space
+    '°': '',       # degree sign, 72f reads fine
+    '‐': '-', '‑': '-', '‒': '-', '–': '-', '—': '-', '―': '-',
+    '‘': "'", '’': "'", '‚': "'", '‛': "'", '′': "'",
+    '“': '"', '”': '"', '„': '"', '‟': '"', '″': '"',
+    '«': '"', '»': '"',
+    '•': '*', '·': '*',
+    '…': '...',
+    '×': 'x',
+    '™': 'TM', '©': '(C)', '®': '(R)',
+    '€': 'EUR', '£': 'GBP', '¥': 'JPY',
+    'ß': 'ss', 'æ': 'ae', 'Æ': 'AE', 'œ': 'oe', 'Œ': 'OE',
+    'ø': 'o', 'Ø': 'O', 'ł': 'l', 'Ł': 'L', 'đ': 'd', 'Đ': 'D',
+}
+
+# drawn when there is nothing better
+UNKNOWN_CHAR = '?'
+
+# assumed when the fonts can't be read
+ASCII = frozenset(chr(code) for code in range(0x20, 0x7f))
+
+
+def font_coverage(font_files):
+    """
+    Return the characters all of the fonts have glyphs for, or printable ASCII if a
+    font can't be read.
+    """
+
+    coverage = None
+    for font_file in font_files:
+        try:
+            chars = {chr(code) for code in bdf.BdfFont(font_file).glyphs if code != bdf.REPLACEMENT_CHAR}
+        except Exception as ex:
+            print('Font error: {}'.format(ex))
+            return ASCII
+        coverage = chars if coverage is None else coverage & chars
+    return ASCII if coverage is None else frozenset(coverage)
+
+
+class TextNormalizer:
+    """
+    Normalise text for the fonts given, or for printable ASCII without fonts. The fonts
+    are read on first use, so creating a normalizer doesn't slow down start up.
+    """
+
+    def __init__(self, font_files=(), size=NORMALIZE_CACHE_SIZE):
+        self.font_files = tuple(font_files)
+        self.coverage = None
+        self.size = size
+        self.cache = collections.OrderedDict()
+
+    def normalize(self, text):
+        """
+        Return the text with only characters the fonts can draw.
+        """
+
+        normalized = self.cache.get(text)
+        if normalized is not None:
+            self.cache.move_to_end(text)
+            return normalized
+
+        if self.coverage is None:
+            self.coverage = font_coverage(self.font_files)
+
+        # most strings are already fine
+        if all(char in self.coverage for char in text):
+            normalized = text
+        else:
+            normalized = ''.join(self.substitute(char) for char in text)
+
+        self.cache[text] = normalized
+        if len(self.cache) > self.size:
+            self.cache.popitem(last=False)
+        return normalized
+
+    def substitute(self, char):
+        """
+        Return what to draw for a single character.
+        """
+
+        if char in self.coverage:
+            return char
+
+        substitute = SUBSTITUTES.get(char)
+        if substitute is not None and all(sub in self.coverage for sub in substitute):
+            return substitute
+
+        # control characters (e.g., new lines in headlines) become spaces
+        category = unicodedata.category(char)
+        if category.startswith('C'):
+            return ' ' if ' ' in self.coverage else ''
+
+        # combining marks on their own are dropped
+        if category.startswith('M'):
+            return ''
+
+        # otherwise the letter without its accents, e.g. é -> e, or ﬁ -> fi
+        decomposed = ''.join(sub for sub in unicodedata.normalize('NFKD', char)
+                             if not unicodedata.category(sub).startswith('M'))
+        if decomposed and decomposed != char and all(sub in self.coverage for sub in decomposed):
+            return decomposed
+        return UNKNOWN_CHAR if UNKNOWN_CHAR in self.coverage else ''
+
+#<SDG><
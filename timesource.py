@@ -0,0 +1,105 @@
+"""
+(C) MS Roth 2020-2023
+Time source for the LED clock.
+
+The clock, markets, and weather ask this module for the time instead of calling
+datetime.datetime.now() directly, so a simulated clock can be swapped in to
+fast-forward through days or weeks of updates (see simulate.py).
+"""
+
+import datetime
+import time
+
+
+class SystemTime:
+    """
+    Wall clock time. Jobs run on their own timeloop threads.
+    """
+
+    def now(self, tz=None):
+        return datetime.datetime.now(tz)
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+    def running(self):
+        return True
+
+    def start_jobs(self, tl):
+        tl.start(block=False)
+
+    def stop_jobs(self, tl):
+        tl.stop()
+
+
+class SimulatedTime:
+    """
+    Simulated time that jumps ahead on every sleep() and runs the timeloop jobs
+    inline whenever their interval has elapsed. Stops running at the end time.
+
+    start and end are naive local datetimes.
+    """
+
+    def __init__(self, start, end):
+        self.current = start
+        self.end = end
+        self.jobs = []
+
+    def now(self, tz=None):
+        if tz is None:
+            return self.current
+        return self.current.astimezone(tz)
+
+    def sleep(self, seconds):
+        self.current += datetime.timedelta(seconds=seconds)
+
+        # run any jobs that came due while "sleeping"
+        for job in self.jobs:
+            while job[0] <= self.current:
+                job[0] += job[1].interval
+                job[1].execute(*job[1].args, **job[1].kwargs)
+
+    def running(self):
+        return self.current < self.end
+
+    def start_jobs(self, tl):
+        # schedule the jobs instead of starting their threads
+        self.jobs = [[self.current + j.interval, j] for j in tl.jobs]
+
+    def stop_jobs(self, tl):
+        self.jobs = []
+
+
+# the active time source
+source = SystemTime()
+
+
+def use(new_source):
+    """
+    Replace the active time source, e.g., with a SimulatedTime.
+    """
+
+    global source
+    source = new_source
+
+
+def now(tz=None):
+    return source.now(tz)
+
+
+def sleep(seconds):
+    source.sleep(seconds)
+
+
+def running():
+    return source.running()
+
+
+def start_jobs(tl):
+    source.start_jobs(tl)
+
+
+def stop_jobs(tl):
+    source.stop_jobs(tl)
+
+#<SDG><